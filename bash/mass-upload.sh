@@ -3,7 +3,9 @@
 # This script uploads all files in a directory
 # to Pokémon Central Wiki with given description,
 # using filenames as they are, overwriting if
-# told to and using given throttle
+# told to and using given throttle. Files that
+# are already in the wiki with the same content
+# (same SHA-1) are skipped
 
 # Arguments:
 #	- h: Show this help
@@ -11,27 +13,40 @@
 #	- d: Description
 #	- p: Flag, sets bot throttle to 1
 #	- o: Flag, overwrite file if already exists, defaults to no
+#	- n: Flag, only print which files are new, changed
+#		or identical to those in the wiki, without uploading
+#	- a: Flag, upload all files without comparing them
+#		to those in the wiki
 
 DIR=''
 DESC=''
 PT=''
 OVERWRITE=false
 EXISTSREACTION=abortonwarn
+PLANONLY=false
+ALL=false
+PLANSCRIPT="$(dirname "${BASH_SOURCE[0]}" | xargs readlink -f)/../shared/upload-plan.py"
 
-while getopts "hs:d:po" OPTION; do
+while getopts "hs:d:pona" OPTION; do
 	case $OPTION in
 		h)
 			echo "This script uploads all files in a directory
 to Pokémon Central Wiki with given description,
 using filenames as they are, overwriting if
-told to and using given throttle
+told to and using given throttle. Files that
+are already in the wiki with the same content
+(same SHA-1) are skipped
 
 Arguments:
 	- h: Show this help
 	- s: Source directory
 	- d: Description
 	- p: Flag, sets bot throttle to 0
-	- o: Flag, overwrite file if already exists, defaults to no"
+	- o: Flag, overwrite file if already exists, defaults to no
+	- n: Flag, only print which files are new, changed
+		or identical to those in the wiki, without uploading
+	- a: Flag, upload all files without comparing them
+		to those in the wiki"
 			;;
 		s)
 			DIR="$OPTARG"
@@ -45,6 +60,12 @@ Arguments:
 		o)
 			OVERWRITE=true
 			;;
+		n)
+			PLANONLY=true
+			;;
+		a)
+			ALL=true
+			;;
 		*) # getopts already printed an error message
 			exit 1
 			;;
@@ -55,6 +76,10 @@ if [[ -z $DIR ]]; then
 	echo No source directory specified. Aborting
 	exit 1
 fi
+if [[ $PLANONLY == true ]]; then
+	python "$PYWIKIBOT_DIR"/pwb.py "$PLANSCRIPT" --dir "$DIR"
+	exit 0
+fi
 if [[ -z $DESC ]]; then
 	echo No description given. Aborting
 	exit 1
@@ -62,8 +87,20 @@ fi
 
 if [[ $OVERWRITE == true ]]; then
 	EXISTSREACTION=ignorewarn
+	UPLOADKINDS=new,changed
+else
+	# changed files would not be overwritten anyway
+	UPLOADKINDS=new
+fi
+
+# files to upload, with their SHA-1 compared to those in the wiki
+# in batched queries unless all files have to be uploaded
+if [[ $ALL == true ]]; then
+	FILES=("$DIR"/*)
+else
+	mapfile -t FILES < <(python "$PYWIKIBOT_DIR"/pwb.py "$PLANSCRIPT" --dir "$DIR" --list "$UPLOADKINDS")
 fi
 
-for FILE in "$DIR"/*; do
+for FILE in "${FILES[@]}"; do
     python "$PYWIKIBOT_DIR"/pwb.py upload $PT -keep -noverify -$EXISTSREACTION:exists "$FILE" "$DESC"
 done
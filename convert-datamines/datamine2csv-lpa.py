@@ -6,11 +6,11 @@ to be parsed directly by csv2pokemoves to create a pokemoves-data with LPA only
 data.
 """
 
-import re
 import sys
 import logging
 import os
-from typing import List, Tuple
+from typing import List
+from datamine_parser import DatamineError, parse_learnsets
 
 logger = logging.getLogger("log")
 logger.setLevel(logging.INFO)
@@ -227,48 +227,6 @@ def convert_pokename(poke: str):
         return poke
 
 
-def split_moves(lines: List[str]):
-    """Return a Tuple[List[str], List[str]]
-    These are lists of moves learned by level and tutor respectively
-    """
-    res = []
-    for fline in (
-        "Level Up Moves:",
-        "Legacy Level Up Moves:",
-        "Legacy TMs:",
-        "Legacy TRs:",
-        "Move Shop:",
-    ):
-        try:
-            idx = lines.index(fline) + 1
-            moves = []
-            while idx < len(lines) and lines[idx].startswith("- "):
-                moves.append(lines[idx])
-                idx += 1
-            res.append(moves)
-        except ValueError:
-            res.append([])
-    # Extract only the kinds I need
-    res[0], res[1] = res[0], res[4]
-    return tuple(res)
-
-
-def parse_move_line(line: str, kind: int):
-    if kind == 0:  # level
-        # - [01] [00] Azione
-        regex = "^- \[(\d{1,3})\] \[(\d{1,3})\] .*$"
-    elif kind == 1:  # tutor
-        # - Spaccaroccia
-        regex = "^- (.*)$"
-
-    m = re.match(regex, line.strip())
-    if not m:
-        logger.error("Line of kind {} doesn't match the regex".format(kind))
-        logger.error(line)
-        exit(1)
-    return m.groups()
-
-
 OUTPUT_LINES = [
     "|{}|||{}|{}| //",  # 0 -> level
     "|{}|||{}| //",  # 1 -> tutor
@@ -289,80 +247,22 @@ def get_learnlists(kind: int, parsed_moves: List[str]):
 
 def all_pokes_info(filename):
     res = {}
-    # with open(filename, "r") as f:
-    # 	pokelines = []
-    # 	move = ""
-    # 	for line in f:
-    # 		line = line.strip()
-    # 		if line == "": # Empty lines are the separators
-    # 			try:
-    # 				pokename = pokelines[0].split(" - ")[0].strip()
-    # 			except IndexError:
-    # 				logger.error("Can't find Pokémon name")
-    # 				logger.error(pokelines[0])
-    # 				exit(1)
-    # 			pokename = convert_pokename(pokename)
-    # 			if re.search("-\d+$", pokename):
-    # 				logger.warning("{} name ends in \"-number\". This may point to a missing replacement".format(pokename))
-    # 			logger.info(pokename)
-
-    # 			moves_by_kind = split_moves(pokelines)
-    # 			parsed_moves = (list(map(lambda l: parse_move_line(l, i), lines))
-    # 							for i, lines in enumerate(moves_by_kind))
-    # 			logger.debug(str(list(parsed_moves)))
-    # 			res[pokename] = parsed_moves
-    # 			# for kind, moves in enumerate(parsed_moves):
-    # 			# 	for move in moves:
-    # 			# 		write_row_csv_pokemoves(poke_id, kind, move, csvw)
-    # 			pokelines = []
-    # 		else:
-    # 			pokelines.append(line)
-    # return res
     with open(filename, "r") as f, open("/tmp/massaggiato.txt", "w") as outfile:
-        pokelines = []
-        pokename = False
-        move = ""
-        for line in f:
-            line = line.strip()
-            if line == "======":
-                if not pokename:
-                    if not len(pokelines) == 1:
-                        logger.error(
-                            "More than one line when expecting the Pokémon name"
-                        )
-                        logger.error(str(pokelines))
-                        exit(1)
-                    m = re.match("\d{3,4} \- (.*) \(Stage\: \d\)", pokelines[0])
-                    if not m:
-                        logger.error("Pokémon name line doesn't match the regex")
-                        logger.error(pokelines[0])
-                        exit(1)
-                    pokename = m.group(1)
-                    # pokename = convert_pokename(m.group(1))
-                    pokelines = []
-                else:
-                    if pokelines[0] != "Present: No":
-                        # Pokémon in the game
-                        outfile.write(pokename + "\n")
-                        # if re.search("-\d+$", pokename):
-                        # 	logger.warning("{} name ends in \"-number\". This may point to a missing replacement".format(pokename))
-                        # logger.info(pokename)
-                        moves_by_kind = split_moves(pokelines)
-                        outfile.write("Level:\n")
-                        for line in moves_by_kind[0]:
-                            outfile.write(line + "\n")
-                        outfile.write("Move Shop:\n")
-                        for line in moves_by_kind[1]:
-                            outfile.write(line + "\n")
-                        outfile.write("\n")
-                        # parsed_moves = (list(map(lambda l: parse_move_line(l, i), lines))
-                        # 				for i, lines in enumerate(moves_by_kind))
-                        # logger.debug(str(list(parsed_moves)))
-                        # res[pokename] = parsed_moves
-                    pokelines = []
-                    pokename = False
-            else:
-                pokelines.append(line)
+        try:
+            # only Pokémon in the game are parsed
+            for learnset in parse_learnsets("lpa", f):
+                outfile.write(learnset.name + "\n")
+                level_moves, move_shop = learnset.sections
+                outfile.write("Level:\n")
+                for line in level_moves:
+                    outfile.write(line + "\n")
+                outfile.write("Move Shop:\n")
+                for line in move_shop:
+                    outfile.write(line + "\n")
+                outfile.write("\n")
+        except DatamineError as e:
+            logger.error(e)
+            exit(1)
     return res
 
 
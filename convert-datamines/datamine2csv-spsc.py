@@ -1,23 +1,13 @@
 #!/usr/bin/python3
-import re
 import csv
 import sys
-import logging
-from typing import List, Tuple
+from typing import Iterable, List
+from datamine_parser import DatamineError, parse_learnsets
+from lib import pokemoves_rows, setup_logger
 
-logger = logging.getLogger("log")
-logger.setLevel(logging.DEBUG)
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-file_lh = logging.FileHandler("logs/datamine2csv.log")
-file_lh.setLevel(logging.DEBUG)
-file_lh.setFormatter(formatter)
-logger.addHandler(file_lh)
-
-stdio_lh = logging.StreamHandler()
-stdio_lh.setLevel(logging.WARNING)
-stdio_lh.setFormatter(formatter)
-logger.addHandler(stdio_lh)
+VERSION_GROUP_ID = 19
+# Armor tutors are in IA
+TUTOR_VERSION_GROUP_ID = 20
 
 replaces = {
     "mr.-mime": "mr. mime",
@@ -201,144 +191,28 @@ def convert_pokename(poke: str):
         return poke
 
 
-def get_move_id(move: str):
-    move = move.strip().lower()
-    # 1,botta,1,1,40,35,100,0,10,2,1,,5,1,5
-    with open("docker-db/sourcecsv/moves.csv", "r") as movesfile:
-        moves = csv.reader(movesfile)
-        next(moves)
-        for line in moves:
-            if line[1].strip().lower() == move:
-                return line[0]
-
-
-def get_poke_id(poke: str):
-    poke = poke.strip().lower()
-    # 1,botta,1,1,40,35,100,0,10,2,1,,5,1,5
-    with open("docker-db/sourcecsv/pokemon.csv", "r") as file:
-        r = csv.reader(file)
-        next(r)
-        for line in r:
-            if line[1].strip().lower() == poke:
-                return line[0]
+def datamine_rows(lines: Iterable[str], version_group_id: int, errors: List[str]):
+    """Yield pokemoves rows of a SpSc datamine, collecting errors in errors."""
+    learnsets = parse_learnsets("spsc", lines)
+    return pokemoves_rows(
+        learnsets,
+        convert_pokename,
+        version_group_id,
+        errors,
+        kind_version_groups={4: TUTOR_VERSION_GROUP_ID},
+    )
 
 
-def split_moves(lines: List[str]):
-    """Return a Tuple[List[str], List[str], List[str], List[str]]
-    These are lists of moves learned by level, breed, tm and tutor
-    """
-    res = []
-    for fline in ("Level Up Moves:", "Egg Moves:", "TMs:", "TRs:", "Armor Tutors:"):
+if __name__ == "__main__":
+    logger = setup_logger("logs/datamine2csv.log")
+    errors = []
+    with open(sys.argv[1], "r") as f, open(sys.argv[2], "w") as out:
+        csvw = csv.writer(out)
         try:
-            idx = pokelines.index(fline) + 1
-            moves = []
-            while pokelines[idx].startswith("- "):
-                moves.append(pokelines[idx])
-                idx += 1
-            res.append(moves)
-        except ValueError:
-            res.append([])
-    return tuple(res)
-
-
-def parse_move_line(line: str, kind: int):
-    if kind == 0:
-        # level
-        regex = "^\- \[(\d{1,3})\] (.*)$"
-    elif kind == 1:
-        # breed
-        regex = "^\- (.*)$"
-    elif kind == 2:
-        # tm
-        regex = "^\- \[TM\d{1,3}\] (.*)$"
-    elif kind == 3:
-        # tr
-        regex = "^\- \[TR\d{1,3}\] (.*)$"
-    elif kind == 4:
-        # tutor
-        regex = "^\- (.*)$"
-
-    m = re.match(regex, line)
-    if not m:
-        logger.error("Line of kind " + str(kind) + " doesn't match the regex")
-        logger.error(line)
+            csvw.writerows(datamine_rows(f, VERSION_GROUP_ID, errors))
+        except DatamineError as e:
+            errors.append(str(e))
+    for error in errors:
+        logger.error(error)
+    if errors:
         exit(1)
-    return m.groups()
-
-
-def convert_kind(kind: int):
-    """
-    1,level
-    2,breed
-    3,tutor
-    4,tm
-    """
-    if kind == 0:
-        return 1
-    elif kind == 1:
-        return 2
-    elif kind == 2:
-        return 4
-    elif kind == 3:
-        return 4
-    elif kind == 4:
-        return 3
-
-
-def write_row_csv_pokemoves(poke_id: str, kind: int, elem: Tuple, csvw):
-    if kind == 0:
-        move = elem[1]
-        level = elem[0]
-    else:
-        move = elem[0]
-        level = 0
-    move_id = get_move_id(move)
-    if not move_id:
-        logging.error("No ID for move " + move)
-        exit(1)
-    # pokemon_id,version_group_id,move_id,pokemon_move_method_id,level,order
-    version_group_id = 19
-    if kind == 4:
-        # tutor
-        version_group_id = 20
-    csvw.writerow([poke_id, version_group_id, move_id, convert_kind(kind), level, 0])
-
-
-with open(sys.argv[1], "r") as f, open(sys.argv[2], "w") as out:
-    csvw = csv.writer(out)
-    pokelines = []
-    pokename = False
-    move = ""
-    for line in f:
-        line = line.strip()
-        if line == "======":
-            if not pokename:
-                if not len(pokelines) == 1:
-                    logger.error("More than one line when expecting the Pokémon name")
-                    exit(1)
-                m = re.match("\d{3,4} \- (.*) \(Stage\: \d\)", pokelines[0])
-                if not m:
-                    logger.error("Pokémon name line doesn't match the regex")
-                    logger.error(pokelines[0])
-                    exit(1)
-                pokename = convert_pokename(m.group(1))
-                poke_id = get_poke_id(pokename)
-                if not poke_id:
-                    logger.error("No ID for Pokémon " + pokename)
-                    exit(1)
-                logger.info(pokename)
-            else:
-                moves_by_kind = split_moves(pokelines)
-                # logger.debug(str(moves_by_kind))
-                parsed_moves = (
-                    list(map(lambda l: parse_move_line(l, i), lines))
-                    for i, lines in enumerate(moves_by_kind)
-                )
-                # logger.debug(str(parsed_moves))
-                for kind, moves in enumerate(parsed_moves):
-                    for move in moves:
-                        write_row_csv_pokemoves(poke_id, kind, move, csvw)
-                pokelines = []
-                pokename = False
-        else:
-            pokelines.append(line)
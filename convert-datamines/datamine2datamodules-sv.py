@@ -1,9 +1,9 @@
 #!/usr/bin/python3
 import re
-import csv
 import sys
 import logging
 from typing import List, Tuple
+from datamine_parser import DatamineError, blank_separated_blocks
 from lib import replaces, should_ignore
 
 logger = logging.getLogger("log")
@@ -130,37 +130,26 @@ def print_pokestatsdata(name: str, data: List[int]):
 
 
 with open(sys.argv[1], "r") as f, open(sys.argv[2], "w") as out:
-    csvw = csv.writer(out)
-    pokelines = []
-    move = ""
-    for line in f:
-        line = line.strip()
-        if line == "":  # Empty lines are the separators
-            try:
-                pokename = pokelines[0].split(" - ")[0].strip()
-            except IndexError:
-                logger.error("Can't find Pokémon name")
-                logger.error(lines[0])
-                exit(1)
+    try:
+        for header, body in blank_separated_blocks(f):
+            pokename = header.split(" - ")[0].strip()
             normalized_name = convert_pokename(pokename)
             logger.debug(normalized_name)
             if should_ignore(normalized_name):
                 # Ignore a bunch of forms
-                pokelines = []
                 continue
 
             # Extract data from the first line
-            poke_data = get_data(pokelines[0])
+            poke_data = get_data(header)
             logger.debug(poke_data)
             # Get evolutions, if any
-            if pokelines[1] == "Evolutions:":
-                evodata = get_evodata(pokelines[2 : pokelines.index("Learned Moves:")])
+            if body[0] == "Evolutions:":
+                evodata = get_evodata(body[1 : body.index("Learned Moves:")])
 
             out.write(pokename + "\n")
             # out.write(print_pokedata(normalized_name, pokename, poke_data["types"]) + "\n")
             # out.write(print_pokeabildata(normalized_name, poke_data["abils"]) + "\n")
             # out.write(print_pokestatsdata(normalized_name, poke_data["stats"]) + "\n")
-
-            pokelines = []
-        else:
-            pokelines.append(line)
+    except DatamineError as e:
+        logger.error(e)
+        exit(1)
@@ -1,7 +1,19 @@
 #!/usr/bin/python3
+"""Print Lua data modules from a datamine.
 
+Usage: datamine2luamodule.py GAME MODULE[,MODULE...] DATAMINE [OUTDIR]
+
+Modules are poke-data, poke-abils and poke-stats. Without OUTDIR, the only
+given module is printed to stdout. With OUTDIR, the datamine is parsed once and
+each given module is written to OUTDIR/<module>.lua; entries of each module and
+parse time are then reported on stderr.
+"""
+
+import os
 import sys
-from typing import Callable, Literal
+import time
+from contextlib import ExitStack
+from typing import Callable, Literal, Optional, TextIO
 
 from datamine_parser import Game, Pkmn, parse_pkmn
 
@@ -14,21 +26,58 @@ extractors: dict[LuaModule, Callable[[Pkmn], str]] = {
 }
 
 
-def main(game: Game, lua_module: LuaModule, datamine_file: str):
+def write_modules(
+    game: Game, outputs: dict[LuaModule, TextIO], datamine_file: str
+) -> dict[LuaModule, int]:
+    """Parse the datamine once, writing an entry of each module for every Pokémon.
+
+    Return the number of entries written to each module.
+    """
     parser = parse_pkmn(game)
-    extractor = extractors[lua_module]
+    counts = dict.fromkeys(outputs, 0)
 
     with open(datamine_file, "r", encoding="utf-8") as f:
-        datamine_lines = map(str.strip, f.readlines())
+        # lines are read lazily, so memory use doesn't depend on datamine size
+        datamine_lines = map(str.strip, f)
 
         try:
             while True:
                 pkmn = parser(datamine_lines)
                 if pkmn is not None:
-                    print(extractor(pkmn))
+                    for lua_module, output in outputs.items():
+                        output.write(extractors[lua_module](pkmn) + "\n")
+                        counts[lua_module] += 1
         except StopIteration:
             pass
+    return counts
+
+
+def main(game: Game, lua_modules: str, datamine_file: str, outdir: Optional[str] = None):  # fmt: skip
+    modules = lua_modules.split(",")
+    unknown = [lua_module for lua_module in modules if lua_module not in extractors]
+    if unknown:
+        sys.exit(f"Unknown modules {', '.join(unknown)}, expected {', '.join(extractors)}")  # fmt: skip
+    if outdir is None:
+        if len(modules) > 1:
+            sys.exit("An output directory is needed to write more than one module")
+        write_modules(game, {modules[0]: sys.stdout}, datamine_file)
+        return
+
+    with ExitStack() as stack:
+        outputs = {
+            lua_module: stack.enter_context(
+                open(os.path.join(outdir, f"{lua_module}.lua"), "w", encoding="utf-8")
+            )
+            for lua_module in modules
+        }
+        start = time.perf_counter()
+        counts = write_modules(game, outputs, datamine_file)
+        elapsed = time.perf_counter() - start
+
+    for lua_module, count in counts.items():
+        print(f"{lua_module}: {count} entries", file=sys.stderr)
+    print(f"Datamine parsed in {elapsed * 1000:.1f} ms", file=sys.stderr)
 
 
 if __name__ == "__main__":
-    main(sys.argv[1], sys.argv[2], sys.argv[3])
+    main(*sys.argv[1:5])
@@ -1,14 +1,25 @@
-from typing import Callable, Generator, Literal, Optional
+from typing import Callable, Iterator, Literal, Optional
 
 from . import dtos, lpza
+from .learnsets import (
+    DatamineError,
+    LearnedMove,
+    Learnset,
+    LearnsetFormat,
+    blank_separated_blocks,
+    learnset_formats,
+    parse_learnsets,
+    register_format,
+)
 
 Game = Literal["lpza"]
+LearnsetGame = Literal["sv", "sv2", "sv3", "bdsp", "spsc", "lpa"]
 Pkmn = dtos.Pkmn
 
 
 def parse_pkmn(
     parser: Literal["lpza"],
-) -> Callable[[Generator[str]], Optional[dtos.Pkmn]]:
+) -> Callable[[Iterator[str]], Optional[dtos.Pkmn]]:
     match parser:
         case "lpza":
             return lpza.parse_pkmn
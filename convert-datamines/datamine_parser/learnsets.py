@@ -0,0 +1,385 @@
+"""Streaming parsers of learnsets in datamines of every supported game.
+
+Datamines are read line by line: only the block of the Pokémon being parsed is
+kept in memory, so memory use doesn't depend on the size of the datamine. Each
+game registers a LearnsetFormat in learnset_formats, with patterns compiled once
+when this module is imported.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+Level = Union[str, int]
+Blocks = Iterator[Tuple[str, List[str]]]
+
+
+class DatamineError(ValueError):
+    """A datamine line that doesn't follow the format of its game."""
+
+    def __init__(self, message: str, line: str = ""):
+        super().__init__(message)
+        self.line = line
+
+    def __str__(self) -> str:
+        message = super().__str__()
+        return f"{message}: {self.line}" if self.line else message
+
+
+class LearnedMove(NamedTuple):
+    kind: int
+    # pokemon_move_method_id in the db
+    method: int
+    move: str
+    level: Level
+
+
+@dataclass(frozen=True)
+class LearnsetFormat:
+    # split datamine lines into (header, body) of each Pokémon
+    blocks: Callable[[Iterable[str]], Blocks]
+    # get Pokémon name from header
+    parse_name: Callable[[str], str]
+    # get entries of each kind of moves from body
+    split_sections: Callable[[List[str]], List[List[str]]]
+    # get (move, level) pairs from an entry of given kind
+    parse_entry: Callable[[str, int], List[Tuple[str, Level]]]
+    # pokemon_move_method_id of each kind of moves
+    methods: Tuple[int, ...]
+    # whether Pokémon is in the game, given body
+    is_present: Callable[[List[str]], bool] = lambda body: True
+
+
+@dataclass
+class Learnset:
+    name: str
+    # raw entries of each kind of moves, as in the datamine
+    sections: List[List[str]]
+    format: LearnsetFormat
+
+    def moves(self) -> Iterator[LearnedMove]:
+        for kind, entries in enumerate(self.sections):
+            for entry in entries:
+                for move, level in self.format.parse_entry(entry, kind):
+                    yield LearnedMove(kind, self.format.methods[kind], move, level)
+
+
+learnset_formats: Dict[str, LearnsetFormat] = {}
+
+
+def register_format(game: str, learnset_format: LearnsetFormat):
+    learnset_formats[game] = learnset_format
+
+
+def parse_learnsets(game: str, lines: Iterable[str]) -> Iterator[Learnset]:
+    """Yield learnsets of Pokémon in a datamine, reading its lines lazily."""
+    learnset_format = learnset_formats[game]
+    for header, body in learnset_format.blocks(lines):
+        if learnset_format.is_present(body):
+            yield Learnset(
+                learnset_format.parse_name(header),
+                learnset_format.split_sections(body),
+                learnset_format,
+            )
+
+
+# ===================== Blocks =====================
+
+
+def blank_separated_blocks(lines: Iterable[str]) -> Blocks:
+    """Blocks separated by empty lines, with the header as first line."""
+    block = []
+    for line in lines:
+        line = line.strip()
+        if line == "":
+            if not block:
+                raise DatamineError("Can't find Pokémon name")
+            yield block[0], block[1:]
+            block = []
+        else:
+            block.append(line)
+
+
+def delimited_blocks(lines: Iterable[str]) -> Blocks:
+    """Blocks laid out as header line, "======", body lines, "======"."""
+    block = []
+    header = None
+    for line in lines:
+        line = line.strip()
+        if line != "======":
+            block.append(line)
+        elif header is None:
+            if not len(block) == 1:
+                raise DatamineError(
+                    "More than one line when expecting the Pokémon name", str(block)
+                )
+            header = block[0]
+            block = []
+        else:
+            yield header, block
+            header = None
+            block = []
+
+
+# ===================== Sections =====================
+
+
+def heading_sections(
+    headings: Tuple[str, ...], is_entry: Callable[[str], bool]
+) -> Callable[[List[str]], List[List[str]]]:
+    """Entries following each heading, as long as they satisfy is_entry."""
+
+    def split_sections(body: List[str]) -> List[List[str]]:
+        res = []
+        for heading in headings:
+            try:
+                idx = body.index(heading) + 1
+            except ValueError:
+                res.append([])
+                continue
+            entries = []
+            while idx < len(body) and is_entry(body[idx]):
+                entries.append(body[idx])
+                idx += 1
+            res.append(entries)
+        return res
+
+    return split_sections
+
+
+def prefixed_sections(
+    headings: Tuple[str, ...], prefix: str
+) -> Callable[[List[str]], List[List[str]]]:
+    """Entries following each heading, as long as they start with prefix."""
+    return heading_sections(headings, lambda line: line.startswith(prefix))
+
+
+def headed_sections(
+    headings: Tuple[str, ...],
+) -> Callable[[List[str]], List[List[str]]]:
+    """Entries following each heading, up to the next heading."""
+    return heading_sections(headings, lambda line: line not in headings)
+
+
+def match_entry(pattern: re.Pattern, entry: str, kind: int) -> re.Match:
+    m = pattern.match(entry)
+    if not m:
+        raise DatamineError(f"Line of kind {kind} doesn't match the regex", entry)
+    return m
+
+
+HEADER_REGEX = re.compile(r"\d{3,4} \- (.*) \(Stage\: \d\)")
+ENTRY_REGEX = re.compile(r"^\- (.*)$")
+LEVEL_ENTRY_REGEX = re.compile(r"^\- \[(\d{1,3})\] (.*)$")
+TM_ENTRY_REGEX = re.compile(r"^\- \[TM\d{1,3}\] (.*)$")
+
+
+def parse_header(header: str) -> str:
+    m = HEADER_REGEX.match(header)
+    if not m:
+        raise DatamineError("Pokémon name line doesn't match the regex", header)
+    return m.group(1)
+
+
+# ===================== SV =====================
+# Bulbasaur - 45/49/49/65/65/45 (Total: 318) - Erba/Veleno - ...
+# Learned Moves:
+# Azione @ Lv. 1
+# Frustata @ Evolution
+# Egg Moves:
+# Botta, Colpokarate
+
+SV_LEVEL_REGEX = re.compile(r"^(.+) @ Lv. (\d{1,3})$")
+SV_EVOLUTION_REGEX = re.compile(r"^(.+) @ Evolution$")
+
+
+def parse_sv_entry(entry: str, kind: int) -> List[Tuple[str, Level]]:
+    if kind == 0:
+        # level
+        m = SV_LEVEL_REGEX.match(entry)
+        if m:
+            return [m.groups()]
+        m = match_entry(SV_EVOLUTION_REGEX, entry, kind)
+        return [(m.group(1), 0)]
+    # breed or tm or reminder
+    return [(move, 0) for move in entry.split(", ")]
+
+
+register_format(
+    "sv",
+    LearnsetFormat(
+        blocks=blank_separated_blocks,
+        parse_name=lambda header: header.split(" - ")[0].strip(),
+        split_sections=headed_sections(
+            ("Learned Moves:", "Egg Moves:", "TM Moves:", "Reminder Moves:")
+        ),
+        parse_entry=parse_sv_entry,
+        methods=(1, 2, 4, 11),
+    ),
+)
+
+
+# ===================== SV DLCs =====================
+# 0001 - Bulbasaur (Stage: 0)
+# ======
+# Level Up Moves:
+# - [01] Azione
+# TM Learn:
+# - [TM001] Azione
+# ======
+
+SV_KIND_REGEXES = (LEVEL_ENTRY_REGEX, TM_ENTRY_REGEX, ENTRY_REGEX, ENTRY_REGEX)
+
+
+def parse_sv2_entry(entry: str, kind: int) -> List[Tuple[str, Level]]:
+    m = match_entry(SV_KIND_REGEXES[kind], entry, kind)
+    if kind == 0:
+        # level
+        return [(m.group(2), str(int(m.group(1))))]
+    # tm, breed, reminder
+    return [(m.group(1), 0)]
+
+
+def sv_dlc_format(regional_ndex: str) -> LearnsetFormat:
+    regional_ndex_regex = re.compile(regional_ndex)
+    return LearnsetFormat(
+        blocks=delimited_blocks,
+        parse_name=lambda header: regional_ndex_regex.sub(
+            "", parse_header(header)
+        ).strip(),
+        split_sections=prefixed_sections(
+            ("Level Up Moves:", "TM Learn:", "Egg Moves:", "Reminder:"), "- "
+        ),
+        parse_entry=parse_sv2_entry,
+        methods=(1, 4, 2, 11),
+    )
+
+
+register_format("sv2", sv_dlc_format(r"(K)?#\d{3}"))
+register_format("sv3", sv_dlc_format(r"(K|B)?#\d{3}"))
+
+
+# ===================== BDSP =====================
+# Bulbasaur - ...
+# Egg Moves: Botta, Colpokarate
+# TM Moves: TM01 Botta, TM02 Colpokarate
+# Learned Moves:
+# Azione @ 1
+
+BDSP_HEADINGS = ("Egg Moves:", "TM Moves:", "Tutor Moves:")
+BDSP_KIND_REGEXES = (
+    re.compile(r"^(.*) @ (\d{1,3})$"),
+    re.compile(r"^(.*)$"),
+    re.compile(r"^TM\d{2,3} (.*)$"),
+    re.compile(r"^(.*)$"),
+)
+
+
+def split_bdsp_sections(body: List[str]) -> List[List[str]]:
+    # level moves are all lines after their heading
+    try:
+        res = [body[body.index("Learned Moves:") + 1 :]]
+    except ValueError:
+        res = [[]]
+    # egg, TM and possibly tutors (we don't have tutors data yet) are in one line
+    for heading in BDSP_HEADINGS:
+        movesline = next((l for l in body if l.startswith(heading)), None)
+        res.append([] if movesline is None else movesline[len(heading) :].split(","))
+    return res
+
+
+def parse_bdsp_entry(entry: str, kind: int) -> List[Tuple[str, Level]]:
+    m = match_entry(BDSP_KIND_REGEXES[kind], entry.strip(), kind)
+    if kind == 0:
+        # level
+        return [(m.group(1), m.group(2))]
+    return [(m.group(1), 0)]
+
+
+register_format(
+    "bdsp",
+    LearnsetFormat(
+        blocks=blank_separated_blocks,
+        parse_name=lambda header: header.split("-")[0].strip(),
+        split_sections=split_bdsp_sections,
+        parse_entry=parse_bdsp_entry,
+        methods=(1, 2, 4, 3),
+    ),
+)
+
+
+# ===================== SpSc =====================
+# 0001 - Bulbasaur (Stage: 0)
+# ======
+# Level Up Moves:
+# - [01] Azione
+# TRs:
+# - [TR01] Azione
+# ======
+
+SPSC_KIND_REGEXES = (
+    LEVEL_ENTRY_REGEX,
+    ENTRY_REGEX,
+    TM_ENTRY_REGEX,
+    re.compile(r"^\- \[TR\d{1,3}\] (.*)$"),
+    ENTRY_REGEX,
+)
+
+
+def parse_spsc_entry(entry: str, kind: int) -> List[Tuple[str, Level]]:
+    m = match_entry(SPSC_KIND_REGEXES[kind], entry, kind)
+    if kind == 0:
+        # level
+        return [(m.group(2), m.group(1))]
+    # breed, tm, tr, tutor
+    return [(m.group(1), 0)]
+
+
+register_format(
+    "spsc",
+    LearnsetFormat(
+        blocks=delimited_blocks,
+        parse_name=parse_header,
+        split_sections=prefixed_sections(
+            ("Level Up Moves:", "Egg Moves:", "TMs:", "TRs:", "Armor Tutors:"), "- "
+        ),
+        parse_entry=parse_spsc_entry,
+        methods=(1, 2, 4, 4, 3),
+    ),
+)
+
+
+# ===================== LPA =====================
+# 0001 - Bulbasaur (Stage: 0)
+# ======
+# Present: Yes
+# Level Up Moves:
+# - [01] [00] Azione
+# Move Shop:
+# - Spaccaroccia
+# ======
+
+LPA_KIND_REGEXES = (re.compile(r"^- \[(\d{1,3})\] \[\d{1,3}\] (.*)$"), ENTRY_REGEX)
+
+
+def parse_lpa_entry(entry: str, kind: int) -> List[Tuple[str, Level]]:
+    m = match_entry(LPA_KIND_REGEXES[kind], entry, kind)
+    if kind == 0:
+        # level
+        return [(m.group(2), str(int(m.group(1))))]
+    # tutor
+    return [(m.group(1), 0)]
+
+
+register_format(
+    "lpa",
+    LearnsetFormat(
+        blocks=delimited_blocks,
+        parse_name=parse_header,
+        # extract only the kinds we need: level and move shop
+        split_sections=prefixed_sections(("Level Up Moves:", "Move Shop:"), "- "),
+        parse_entry=parse_lpa_entry,
+        methods=(1, 3),
+        is_present=lambda body: body[:1] != ["Present: No"],
+    ),
+)
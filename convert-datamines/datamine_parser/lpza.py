@@ -1,12 +1,12 @@
 from itertools import cycle, dropwhile, islice
-from typing import Generator, Optional, Tuple
+from typing import Iterator, Optional, Tuple
 
 from lib import find
 
 from .dtos import Abilities, Pkmn, Stats
 
 
-def parse_pkmn(datamine_lines: Generator[str]) -> Optional[Pkmn]:
+def parse_pkmn(datamine_lines: Iterator[str]) -> Optional[Pkmn]:
     next(dropwhile(lambda l: l != "======", datamine_lines))
 
     ndex_and_name_line = next(datamine_lines)
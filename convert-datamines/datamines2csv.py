@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""Convert datamines of many games to a single pokemoves csv.
+
+Usage: datamines2csv.py MANIFEST OUTPUT [WORKERS]
+
+MANIFEST is a csv with header game,datamine,version_group_id and a line for each
+datamine to convert, where game is one of the datamine2csv-<game>.py scripts
+(except lpa, whose output isn't a pokemoves csv). Datamines are converted in
+parallel by WORKERS processes (default: number of CPUs), which share the ID
+indexes loaded once by this process. Rows are merged in manifest order, so
+OUTPUT doesn't depend on which worker finishes first.
+
+Errors are collected for each game instead of stopping at the first one; if
+there are any, they're all reported and OUTPUT isn't written.
+"""
+
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import module_from_spec, spec_from_file_location
+from typing import List, Tuple
+
+import lib
+from datamine_parser import DatamineError
+
+GAMES = ("sv", "sv2", "sv3", "bdsp", "spsc")
+LOGFILE = "logs/datamines2csv.log"
+
+# datamine2csv-<game>.py modules loaded by this process
+front_ends = {}
+
+
+def load_front_end(game: str):
+    if game not in front_ends:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        path = os.path.join(script_dir, f"datamine2csv-{game}.py")
+        spec = spec_from_file_location(f"datamine2csv_{game}", path)
+        front_ends[game] = module_from_spec(spec)
+        spec.loader.exec_module(front_ends[game])
+    return front_ends[game]
+
+
+def read_manifest(filename: str) -> List[Tuple[str, str, int]]:
+    with open(filename, "r") as f:
+        return [
+            (
+                line["game"].strip(),
+                line["datamine"].strip(),
+                int(line["version_group_id"]),
+            )
+            for line in csv.DictReader(f)
+        ]
+
+
+def init_worker(ids_indexes):
+    # IDs are indexed once by the main process instead of once per worker
+    lib.ids_indexes.update(ids_indexes)
+    lib.setup_logger(LOGFILE)
+
+
+def convert_game(game: str, datamine: str, version_group_id: int):
+    """Return pokemoves rows of a datamine and errors found converting it."""
+    if game not in GAMES:
+        return [], [f"Unknown game {game}, expected one of {', '.join(GAMES)}"]
+    errors = []
+    rows = []
+    try:
+        with open(datamine, "r") as f:
+            rows.extend(load_front_end(game).datamine_rows(f, version_group_id, errors))  # fmt: skip
+    except (DatamineError, OSError) as e:
+        errors.append(str(e))
+    return rows, errors
+
+
+def main(manifest_file: str, output_file: str, workers: int = None):
+    logger = lib.setup_logger(LOGFILE)
+    entries = read_manifest(manifest_file)
+    lib.get_move_ids()
+    lib.get_poke_ids()
+
+    with ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(lib.ids_indexes,)
+    ) as executor:
+        futures = [executor.submit(convert_game, *entry) for entry in entries]
+        results = [future.result() for future in futures]
+
+    failed = False
+    for (game, datamine, _), (rows, errors) in zip(entries, results):
+        print(f"{game} ({datamine}): {len(rows)} rows, {len(errors)} errors")
+        for error in errors:
+            logger.error(f"{game} ({datamine}): {error}")
+        failed = failed or bool(errors)
+    if failed:
+        exit(1)
+
+    with open(output_file, "w") as out:
+        csvw = csv.writer(out, lineterminator="\n")
+        for rows, _ in results:
+            csvw.writerows(rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -1,5 +1,11 @@
 import csv
+import difflib
+import logging
 import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+MOVES_CSV = "docker-db/sourcecsv/moves.csv"
+POKEMON_CSV = "docker-db/sourcecsv/pokemon.csv"
 
 replaces = {
     "mr.-mime": "mr. mime",
@@ -284,6 +290,11 @@ ignores = list(
 
 IS_VALID_IDENTIFIER = re.compile(r"[_\w][_\w\d]*")
 
+# indexes of IDs in source CSVs, loaded on first use
+ids_indexes: Dict[str, Dict[str, str]] = {}
+
+logger = logging.getLogger("log")
+
 
 def convert_pokename(poke: str):
     poke = poke.lower().replace(" ", "-")
@@ -297,26 +308,68 @@ def find(items, predicate):
     return next(i for i in items if predicate(i))
 
 
-def get_move_id(move: str):
-    move = move.strip().lower()
-    # 1,botta,1,1,40,35,100,0,10,2,1,,5,1,5
-    with open("docker-db/sourcecsv/moves.csv", "r") as movesfile:
-        moves = csv.reader(movesfile)
-        next(moves)
-        for line in moves:
-            if line[1].strip().lower() == move:
-                return line[0]
+def normalize_name(name: str) -> str:
+    """Normalize a move or Pokémon name as keys of the ID indexes."""
+    return name.strip().lower().replace(" ", "-")
 
 
-def get_poke_id(poke: str):
-    poke = poke.strip().lower()
+def load_ids(filename: str) -> Dict[str, str]:
+    """Index IDs of a source CSV by normalized identifier.
+
+    The first line with a given identifier wins, as when scanning the file.
+    """
     # 1,botta,1,1,40,35,100,0,10,2,1,,5,1,5
-    with open("docker-db/sourcecsv/pokemon.csv", "r") as file:
+    ids = {}
+    with open(filename, "r") as file:
         r = csv.reader(file)
         next(r)
         for line in r:
-            if line[1].strip().lower() == poke:
-                return line[0]
+            ids.setdefault(normalize_name(line[1]), line[0])
+    return ids
+
+
+def get_move_ids() -> Dict[str, str]:
+    """Return IDs of moves by normalized name, reading the CSV only once."""
+    if "moves" not in ids_indexes:
+        ids_indexes["moves"] = load_ids(MOVES_CSV)
+    return ids_indexes["moves"]
+
+
+def get_poke_ids() -> Dict[str, str]:
+    """Return IDs of Pokémon by normalized name, reading the CSV only once.
+
+    Datamine names in replaces are indexed too, with the ID of their replacement,
+    so that names can be looked up either before or after convert_pokename.
+    """
+    if "pokes" not in ids_indexes:
+        ids = load_ids(POKEMON_CSV)
+        for name, replacement in replaces.items():
+            if normalize_name(replacement) in ids:
+                ids.setdefault(normalize_name(name), ids[normalize_name(replacement)])
+        ids_indexes["pokes"] = ids
+    return ids_indexes["pokes"]
+
+
+def get_move_id(move: str) -> Optional[str]:
+    return get_move_ids().get(normalize_name(move))
+
+
+def get_poke_id(poke: str) -> Optional[str]:
+    return get_poke_ids().get(normalize_name(poke))
+
+
+def suggest_names(name: str, ids: Dict[str, str]) -> str:
+    """Return a hint with the indexed names closest to an unknown one, if any."""
+    matches = difflib.get_close_matches(normalize_name(name), ids, n=3)
+    return f" (did you mean {', '.join(matches)}?)" if matches else ""
+
+
+def missing_move_message(move: str) -> str:
+    return "No ID for move " + move + suggest_names(move, get_move_ids())
+
+
+def missing_poke_message(poke: str) -> str:
+    return "No ID for Pokémon " + poke + suggest_names(poke, get_poke_ids())
 
 
 def sanitize_lua_table_key(key: str) -> str:
@@ -325,3 +378,56 @@ def sanitize_lua_table_key(key: str) -> str:
 
 def should_ignore(pokename: str):
     return any(map(lambda p: re.fullmatch(p, pokename), ignores))
+
+
+def setup_logger(logfile: str, level: int = logging.DEBUG) -> logging.Logger:
+    """Log to logfile, and warnings to stderr too, adding handlers only once."""
+    if not logger.handlers:
+        logger.setLevel(level)
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
+        file_lh = logging.FileHandler(logfile)
+        file_lh.setLevel(logging.DEBUG)
+        file_lh.setFormatter(formatter)
+        logger.addHandler(file_lh)
+
+        stdio_lh = logging.StreamHandler()
+        stdio_lh.setLevel(logging.WARNING)
+        stdio_lh.setFormatter(formatter)
+        logger.addHandler(stdio_lh)
+    return logger
+
+
+def pokemoves_rows(
+    learnsets: Iterable,
+    convert_name: Callable[[str], str],
+    version_group_id: int,
+    errors: List[str],
+    ignore: Callable[[str], bool] = lambda pokename: False,
+    kind_version_groups: Optional[Dict[int, int]] = None,
+) -> Iterator[list]:
+    """Yield pokemoves csv rows of the moves in learnsets.
+
+    Moves of kinds in kind_version_groups get that version group instead of
+    version_group_id. Names without ID are appended to errors and skipped, so
+    that all of them are reported at once instead of stopping at the first one.
+    """
+    kind_version_groups = kind_version_groups or {}
+    for learnset in learnsets:
+        pokename = convert_name(learnset.name)
+        if ignore(pokename):
+            # Ignore a bunch of forms
+            continue
+        poke_id = get_poke_id(pokename)
+        if not poke_id:
+            errors.append(missing_poke_message(pokename))
+            continue
+        logger.info(f"{pokename} ({poke_id})")
+        for learned in learnset.moves():
+            move_id = get_move_id(learned.move)
+            if not move_id:
+                errors.append(missing_move_message(learned.move))
+                continue
+            group_id = kind_version_groups.get(learned.kind, version_group_id)
+            # pokemon_id,version_group_id,move_id,pokemon_move_method_id,level,order
+            yield [poke_id, group_id, move_id, learned.method, learned.level, 0]
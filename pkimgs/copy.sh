@@ -7,7 +7,7 @@
 source ../bash/config.sh
 
 declare -a pyfiles
-pyfiles=("pkimgstools.py" "pkimgs-data.py" "pkimgs-create.py" "pkimgs-update.py" "pkimgs-home.py")
+pyfiles=("pkimgstools.py" "pkimgs-data.py" "pkimgs-create.py" "pkimgs-update.py" "pkimgs-home.py" "pkimgs-benchmark.py")
 declare -a dirs
 dirs=("pokepages-availability" "pokepages-exceptions" "pokepages-pokeforms" "pokepages-utils")
 
@@ -0,0 +1,187 @@
+import argparse, itertools, timeit
+from scripts.userscripts.pkimgstools import (
+    import_ndex,
+    import_data,
+    import_with_snapshot,
+    game_to_gen,
+    gen_to_games,
+    get_poke_forms,
+    check_pokeform_game_availability,
+    get_pokeform_gen_games,
+)
+from scripts.userscripts.sprelli import build_classifier, build_template
+
+"""
+This script measures time spent by pkimgstools functions on all Pokémon, to check
+performance of changes without generating or updating pages. Arguments:
+--availability: "yes" to benchmark availability queries (check of every form of
+every Pokémon in every game, and games of every generation where it's available);
+availability of Pokémon is checked both with sets (used by pkimgstools) and with
+lists (as read from JSON file) to compare them.
+--sprelli: "yes" to benchmark classification of file names by sprelli.py, on a
+synthetic corpus of file names of all supported kinds; classification of a smaller
+corpus is also compared with the golden file, to check that it's unchanged.
+--sprellicount: number of file names in synthetic corpus (default 100000).
+--sprelligolden: golden file with expected templates of file names.
+--updategolden: "yes" to overwrite golden file with current templates, to be used
+only when a change of templates is intended.
+--repeat: number of repetitions of each benchmark, best time is printed (default 5).
+"""
+
+
+# check availability of all forms of given Pokémon in all games and generations
+def query_availability(pokes_forms, availpokes, availforms):
+    for poke, forms in pokes_forms.items():
+        for form in forms:
+            for game in game_to_gen:
+                check_pokeform_game_availability(poke, form, game, availpokes, availforms)  # fmt: skip
+            for gen in gen_to_games:
+                get_pokeform_gen_games(poke, form, gen, availpokes, availforms)
+
+
+# arguments of sprelli.py (prefix, type, game, gameabbr, ani) for each kind of files
+sprelli_configs = [
+    ("Spr", "sprite", "Pokémon Rosso e Blu", "rb", "no"),
+    ("Spr", "sprite", "Pokémon Oro e Argento", "oa", "no"),
+    ("Spr", "sprite", "Pokémon Rosso Fuoco e Verde Foglia", "rfvf", "no"),
+    ("Spr", "sprite", "Pokémon Nero e Bianco", "nb", "yes"),
+    ("Spr", "modelli", "Pokémon Scarlatto e Violetto", "sv", "no"),
+    ("Icon", "mugshot", "Pokémon Spada e Scudo", "spsc", ""),
+    ("Spr", "sprite", "Pokémon Spada e Scudo", "dexspsc", ""),
+    ("", "mini sprite", "Pokémon Nero e Bianco", "", ""),
+    ("", "", "", "", ""),
+]
+sprelli_forms = ["", "A", "G", "Mega", "MX", "f", "_r", "Sa"]
+# games before generation 4, whose file names have no gender
+sprelli_genderless = ["rb", "oa", "rfvf"]
+
+
+# generate synthetic file names supported by sprelli.py with given arguments, and a
+# few that aren't supported (other games, or not mini sprites) and are skipped
+def sprelli_names(config, ndexes):
+    prefix, type, _, gameabbr, _ = config
+    for ndex, form in itertools.product(ndexes, sprelli_forms):
+        n = f"{ndex:04}{form}"
+        if prefix:
+            genders = [""] if gameabbr in sprelli_genderless else ["m", "f"]
+            for gender, back, shiny, ext in itertools.product(genders, ["", "d"], ["", "sh"], ["png", "gif"]):  # fmt: skip
+                yield f"{prefix}{gameabbr}{gender}{back}{shiny}{n}.{ext}"
+            yield f"{prefix}xym{n}.png"
+        elif type == "mini sprite":
+            for ani, suffix in itertools.product(["", "Ani"], ["MS", "MS5", "MS4OWE", "MS4OWEsh", "MSDLPS"]):  # fmt: skip
+                yield f"{ani}{n}{suffix}.png"
+            yield f"AniClefairyMS{ndex % 2 + 1}.gif"
+            for img in [f"Homem{n}.png", f"GO{n}.png", f"MastersEX{n}f.png"]:
+                yield img
+        else:
+            for kind, gender, back, shiny in itertools.product(["Home", "Mini"], "mf", ["", "d"], ["", "sh"]):  # fmt: skip
+                yield f"{kind}{gender}{back}{shiny}{n}.png"
+            yield f"Mini{'mf'[ndex % 2]}{n} r.png"
+            for event, gender, shiny in itertools.product(["", " Clone", " FashionWeek21"], ["", " f"], ["", " s"]):  # fmt: skip
+                yield f"GO{n}{event}{gender}{shiny}.png"
+            yield f"GO{n} s f.png"
+            for kind, shiny, event in itertools.product(["Icona", "Sonno"], ["", "sh"], ["", "-Halloween-Arancione"]):  # fmt: skip
+                yield f"Sleep{kind}{shiny}{n}{event}.png"
+            yield f"SleepIcona{n} f.png"
+            for kind, shiny, gender in itertools.product(["Icona", "EX"], ["", "sh"], ["", " f"]):  # fmt: skip
+                yield f"Masters{kind}{shiny}{n}{gender}.png"
+
+
+# build templates of given file names for each configuration of sprelli.py
+def sprelli_templates(corpus):
+    lines = []
+    for config, names in corpus:
+        prefix, type, game, gameabbr, ani = config
+        classifier = build_classifier(prefix, type, gameabbr)
+        for img in names:
+            template = build_template(img, classifier, prefix, type, game, gameabbr, ani, "")  # fmt: skip
+            lines.append(f"{img}\t{template}")
+    return lines
+
+
+# compare templates of golden corpus with golden file, or overwrite golden file
+def check_sprelli_golden(goldenfile, update):
+    corpus = [(config, list(sprelli_names(config, [25]))) for config in sprelli_configs]  # fmt: skip
+    lines = sprelli_templates(corpus)
+    if update:
+        with open(goldenfile, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        print(f"Golden file updated with {len(lines)} file names")
+        return
+    with open(goldenfile, encoding="utf-8") as file:
+        golden = file.read().splitlines()
+    differences = [(old, new) for old, new in zip(golden, lines) if old != new]
+    if len(golden) != len(lines):
+        print(f"Golden file has {len(golden)} file names, corpus has {len(lines)}")
+    for old, new in differences[:20]:
+        print(f"Expected: {old}\nFound:    {new}")
+    print(f"Golden check: {len(differences)} differences on {len(lines)} file names")
+
+
+# run given function many times and print best time
+def benchmark(label, function, repeat):
+    best = min(timeit.repeat(function, number=1, repeat=repeat))
+    print(f"{label}: {best * 1000:.1f} ms")
+
+
+# main function
+def main():
+    # parse arguments
+    parser = argparse.ArgumentParser()
+    # fmt: off
+    parser.add_argument("--dexfile", default="data/wiki-util-data/poke-names.json")
+    parser.add_argument("--genderdatafile", default="data/wiki-util-data/gender-data.json")
+    parser.add_argument("--artsourcesfile", default="data/pokepages-utils/artsources.json")
+    parser.add_argument("--singlemsfile", default="data/pokepages-utils/singleMS.txt")
+    parser.add_argument("--availpokesfile", default="data/wiki-util-data/poke-availability.json")
+    parser.add_argument("--availformsfile", default="data/wiki-util-data/forms-availability.json")
+    parser.add_argument("--rangerfile", default="data/pokepages-utils/redirect_ranger.txt")
+    parser.add_argument("--goformsfile", default="data/pokepages-utils/goforms.txt")
+    parser.add_argument("--snapshotfile", default="data/pokepages-snapshot.pickle")
+    parser.add_argument("--availability", default="no")
+    parser.add_argument("--sprelli", default="no")
+    parser.add_argument("--sprellicount", type=int, default=100000)
+    parser.add_argument("--sprelligolden", default="data/pokepages-utils/sprelli-golden.tsv")
+    parser.add_argument("--updategolden", default="no")
+    parser.add_argument("--repeat", type=int, default=5)
+    # fmt: on
+    args = parser.parse_args()
+    # import data
+    getname, _, _, _, _ = import_with_snapshot(
+        args.snapshotfile, import_ndex, args.dexfile
+    )
+    _, _, _, _, _, availpokes, availforms, _, _ = import_with_snapshot(
+        args.snapshotfile,
+        import_data,
+        args.genderdatafile,
+        args.artsourcesfile,
+        args.singlemsfile,
+        args.availpokesfile,
+        args.availformsfile,
+        args.rangerfile,
+        args.goformsfile,
+    )
+    print(f"Benchmarking {len(getname)} Pokémon")
+    # availability queries
+    if args.availability.lower().strip() == "yes":
+        pokes_forms = {poke: get_poke_forms(poke, availforms) for poke in getname}
+        availpokes_lists = {game: list(ndexes) for game, ndexes in availpokes.items()}
+        benchmark("Availability (sets)", lambda: query_availability(pokes_forms, availpokes, availforms), args.repeat)  # fmt: skip
+        benchmark("Availability (lists)", lambda: query_availability(pokes_forms, availpokes_lists, availforms), args.repeat)  # fmt: skip
+    # classification of file names by sprelli.py
+    if args.sprelli.lower().strip() == "yes":
+        update = args.updategolden.lower().strip() == "yes"
+        check_sprelli_golden(args.sprelligolden, update)
+        # distribute synthetic file names among configurations
+        corpus = []
+        for config in sprelli_configs:
+            names = itertools.cycle(sprelli_names(config, range(1, 1026)))
+            count = args.sprellicount // len(sprelli_configs)
+            corpus.append((config, list(itertools.islice(names, count))))
+        count = sum(len(names) for _, names in corpus)
+        benchmark(f"Sprelli classification ({count} file names)", lambda: sprelli_templates(corpus), args.repeat)  # fmt: skip
+
+
+# invoke main function
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-import argparse, os, json, re
+import argparse, os, json, re, time
+from concurrent.futures import ThreadPoolExecutor
 import pywikibot
 from pywikibot import pagegenerators
 
@@ -10,13 +11,22 @@ manual check is needed (no automatic check is performed because it would require
 a lot of effort to handle all naming conventions). After this, images without
 ndex are counted as well. Arguments:
 --catsfile: path of JSON file with categories names (already populated).
---game: one of the keys in pokepages-utils/categories-names.json.
+--game: one of the keys in pokepages-utils/categories-names.json; more games can be
+compared at once separating them with commas, "all" compares all of them.
 --sourcefam: name of family of source wiki (default "archibulba").
 --destfam: name of family of destination wiki (default "encypok").
 --sourcelang: language of source wiki (default "en").
 --destlang: language of destination wiki (default "it").
 --outdir: if specified, all files in source wiki that may be missing from
 destination wiki are written to a text file in specified directory.
+--report: if specified, a JSON report is written to this file, with files of each
+ndex that are missing from destination or only in destination (compared by name
+without name space), for each game.
+--cachepath: directory where lists of images are saved (default
+"data/pokepages-compare-cache/"); empty to disable cache.
+--cachettl: number of hours a saved list is used before downloading it again
+(default 24), so that repeated comparisons don't need the wikis at all.
+--workers: number of lists downloaded at the same time (default 4).
 """
 
 
@@ -29,71 +39,150 @@ def get_imgs(fam, lang, cat_name):
     return imgs
 
 
+# get a list with all images in specified site and category, reading it from a
+# file in cachepath if it was saved less than ttl hours ago
+def get_cached_imgs(fam, lang, cat_name, cachepath, ttl):
+    if not cachepath:
+        return get_imgs(fam, lang, cat_name)
+    cachefile = os.path.join(cachepath, re.sub(r"\W", "_", f"{fam}-{lang}-{cat_name}") + ".json")  # fmt: skip
+    if os.path.isfile(cachefile):
+        with open(cachefile, "r") as file:
+            cache = json.load(file)
+        if time.time() - cache["timestamp"] < ttl * 3600:
+            return cache["imgs"]
+    imgs = get_imgs(fam, lang, cat_name)
+    with open(cachefile, "w") as file:
+        json.dump({"timestamp": time.time(), "category": cat_name, "imgs": imgs}, file)
+    return imgs
+
+
+# Split images by ndex with a single pass on the list, returning a dict that maps
+# each ndex to its images and a list of images without ndex. Ndexes are numbers
+# of 4 digits (with name space and file extension there is always something
+# before and after them); images with more ndexes are put under all of them.
+def bucket_imgs(imgs):
+    buckets = {}
+    others = []
+    for img in imgs:
+        ndexes = dict.fromkeys(re.findall(r"(?<=\D)\d{4}(?=\D)", img))
+        if not ndexes:
+            others.append(img)
+        for ndex in ndexes:
+            buckets.setdefault(int(ndex), []).append(img)
+    return buckets, others
+
+
 # compare number of images in source and destination
 def compare_pokeimgs(poke, pokeimgs_source, pokeimgs_dest, discrepancies):
     num_source = len(pokeimgs_source)
     num_dest = len(pokeimgs_dest)
     if num_source != num_dest:
-        discrepancies += pokeimgs_source
+        discrepancies.update(pokeimgs_source)
         print(f"#{poke}: source {num_source}, dest {num_dest}")
         print("\n".join(pokeimgs_source + ["------------"] + pokeimgs_dest))
         print("")
     return discrepancies
 
 
-# main function
-def main():
-    # parse arguments
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--catsfile", default="data/pokepages-utils/categories-names.json")  # fmt: skip
-    parser.add_argument("--game", default="")
-    parser.add_argument("--sourcefam", default="archibulba")
-    parser.add_argument("--destfam", default="encypok")
-    parser.add_argument("--sourcelang", default="en")
-    parser.add_argument("--destlang", default="it")
-    parser.add_argument("--outdir", default="")
-    args = parser.parse_args()
-    # read file with categories data and get their names
-    with open(args.catsfile, "r") as file:
-        cats_data = json.load(file)
-    cat_name_source = cats_data[args.game][args.sourcelang]
-    cat_name_dest = cats_data[args.game][args.destlang]
-    print(f'Comparing game "{args.game}" - source "{cat_name_source}" ({args.sourcelang}), destination "{cat_name_dest}" ({args.destlang})')  # fmt: skip
-    # list images in source and destination category
-    imgs_source = get_imgs(args.sourcefam, args.sourcelang, cat_name_source)
-    imgs_dest = get_imgs(args.destfam, args.destlang, cat_name_dest)
+# get report entry for given images if names (without name space) are different
+def get_report_entry(pokeimgs_source, pokeimgs_dest):
+    names_source = {img.split(":", 1)[-1] for img in pokeimgs_source}
+    names_dest = {img.split(":", 1)[-1] for img in pokeimgs_dest}
+    if names_source == names_dest:
+        return None
+    return {
+        "source": len(pokeimgs_source),
+        "dest": len(pokeimgs_dest),
+        "missing": sorted(names_source - names_dest),
+        "extra": sorted(names_dest - names_source),
+    }
+
+
+# Compare images of given game, printing discrepancies or writing them to outdir.
+# Return report as {ndex: entry} for ndexes with different names, ndex is "____"
+# for images without ndex.
+def compare_game(game, cat_name_source, cat_name_dest, imgs_source, imgs_dest, args):  # fmt: skip
+    print(f'Comparing game "{game}" - source "{cat_name_source}" ({args.sourcelang}), destination "{cat_name_dest}" ({args.destlang})')  # fmt: skip
     # print total number of images in source and destination
     print(f"Total: source {len(imgs_source)}, dest {len(imgs_dest)}")
-    # find images without ndex (lookahead/lookbehind not neeeded because
-    # name space and file extension are included)
-    other_source = [i for i in imgs_source if not re.search(r"\D\d{4}\D", i)]
-    other_dest = [i for i in imgs_dest if not re.search(r"\D\d{4}\D", i)]
+    # group images by ndex, and find images without ndex
+    buckets_source, other_source = bucket_imgs(imgs_source)
+    buckets_dest, other_dest = bucket_imgs(imgs_dest)
     # find max ndex
-    nums_source = [i for i in imgs_source if not i in other_source]
-    nums_dest = [i for i in imgs_dest if not i in other_dest]
-    last_ndex = max([int(re.match(r".*(\d{4}).*", i).group(1)) for i in nums_source + nums_dest])  # fmt: skip
+    last_ndex = max(buckets_source.keys() | buckets_dest.keys())
     print(f"Checking all ndexes from #0000 to #{str(last_ndex).zfill(4)}\n")
-    # initialize list with source images that may be missing from destination
-    discrepancies = []
+    # initialize set with source images that may be missing from destination
+    discrepancies = set()
+    report = {}
     # compare by counting number of images for each ndex
     for ndex in range(1, last_ndex + 1):
         poke = str(ndex).zfill(4)
-        pokeimgs_source = [i for i in imgs_source if re.search(r"\D{}\D".format(poke), i)]  # fmt: skip
-        pokeimgs_dest = [i for i in imgs_dest if re.search(r"\D{}\D".format(poke), i)]
+        pokeimgs_source = buckets_source.get(ndex, [])
+        pokeimgs_dest = buckets_dest.get(ndex, [])
         discrepancies = compare_pokeimgs(poke, pokeimgs_source, pokeimgs_dest, discrepancies)  # fmt: skip
+        entry = get_report_entry(pokeimgs_source, pokeimgs_dest)
+        if entry:
+            report[poke] = entry
     # compare number of images without ndex
     discrepancies = compare_pokeimgs("____", other_source, other_dest, discrepancies)
-    # remove duplicated entries if any and convert list to text
-    discrepancies = list(set(discrepancies))
-    discrepancies_text = "\n".join(discrepancies)
+    entry = get_report_entry(other_source, other_dest)
+    if entry:
+        report["____"] = entry
+    # convert set to text
+    discrepancies_text = "\n".join(sorted(discrepancies))
     # check if a file was specified to list all discrepancies
     if not args.outdir:
         print(f"Found {len(discrepancies)} discrepancies:\n{discrepancies_text}")
     else:
-        output_file_path = os.path.join(args.outdir, f"imgs-discrepancies-{args.game}.txt")  # fmt: skip
+        output_file_path = os.path.join(args.outdir, f"imgs-discrepancies-{game}.txt")  # fmt: skip
         print(f"Writing {len(discrepancies)} discrepancies to file {output_file_path}")
         with open(output_file_path, "w") as file:
             file.write(discrepancies_text + "\n")
+    return report
+
+
+# main function
+def main():
+    # parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catsfile", default="data/pokepages-utils/categories-names.json")  # fmt: skip
+    parser.add_argument("--game", default="")
+    parser.add_argument("--sourcefam", default="archibulba")
+    parser.add_argument("--destfam", default="encypok")
+    parser.add_argument("--sourcelang", default="en")
+    parser.add_argument("--destlang", default="it")
+    parser.add_argument("--outdir", default="")
+    parser.add_argument("--report", default="")
+    parser.add_argument("--cachepath", default="data/pokepages-compare-cache/")
+    parser.add_argument("--cachettl", type=float, default=24)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    # read file with categories data and get their names
+    with open(args.catsfile, "r") as file:
+        cats_data = json.load(file)
+    games = list(cats_data) if args.game == "all" else args.game.split(",")
+    if args.cachepath and not os.path.isdir(args.cachepath):
+        os.mkdir(args.cachepath)
+    # list images in source and destination categories of all games, downloading
+    # them at the same time
+    with ThreadPoolExecutor(args.workers) as executor:
+        imgs = {}
+        for game in games:
+            for wiki, fam, lang in [("source", args.sourcefam, args.sourcelang), ("dest", args.destfam, args.destlang)]:  # fmt: skip
+                imgs[(game, wiki)] = executor.submit(get_cached_imgs, fam, lang, cats_data[game][lang], args.cachepath, args.cachettl)  # fmt: skip
+    # compare games
+    report = {}
+    for game in games:
+        cat_name_source = cats_data[game][args.sourcelang]
+        cat_name_dest = cats_data[game][args.destlang]
+        imgs_source = imgs[(game, "source")].result()
+        imgs_dest = imgs[(game, "dest")].result()
+        report[game] = compare_game(game, cat_name_source, cat_name_dest, imgs_source, imgs_dest, args)  # fmt: skip
+        print("")
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=4)
+        print(f"Report written to file {args.report}")
 
 
 # invoke main function
@@ -2,8 +2,11 @@ import argparse, os, os.path, re
 from scripts.userscripts.pkimgstools import (
     import_ndex,
     import_data,
+    import_with_snapshot,
     get_poke_data,
     build_poke_page,
+    report_unmatched_exceptions,
+    run_for_pokes,
 )
 
 """
@@ -29,6 +32,7 @@ def main():
     parser.add_argument("--pokelistspath", default="data/pokepages-pokelists/")
     parser.add_argument("--pokepage", default="")
     parser.add_argument("--pokepagespath", default="data/pokepages-created/")
+    parser.add_argument("--bundlefile", default="")
     parser.add_argument("--exceptionspath", default="data/pokepages-exceptions/")
     parser.add_argument("--dexfile", default="data/wiki-util-data/poke-names.json")
     parser.add_argument("--genderdatafile", default="data/wiki-util-data/gender-data.json")
@@ -38,12 +42,16 @@ def main():
     parser.add_argument("--availformsfile", default="data/wiki-util-data/forms-availability.json")
     parser.add_argument("--rangerfile", default="data/pokepages-utils/redirect_ranger.txt")
     parser.add_argument("--goformsfile", default="data/pokepages-utils/goforms.txt")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--snapshotfile", default="data/pokepages-snapshot.pickle")
     # fmt: on
     args = parser.parse_args()
     # create wikicode of subpage
     if args.pokepage:
         # import data
-        getname, getenname, getesname, getdename, getfrname = import_ndex(args.dexfile)
+        getname, getenname, getesname, getdename, getfrname = import_with_snapshot(
+            args.snapshotfile, import_ndex, args.dexfile
+        )
         (
             genderdiffs,
             genderforms,
@@ -54,7 +62,9 @@ def main():
             availforms,
             rangerdata,
             goforms,
-        ) = import_data(
+        ) = import_with_snapshot(
+            args.snapshotfile,
+            import_data,
             args.genderdatafile,
             args.artsourcesfile,
             args.singlemsfile,
@@ -64,22 +74,26 @@ def main():
             args.goformsfile,
         )
         # build page
-        if not os.path.isdir(args.pokepagespath):
-            os.mkdir(args.pokepagespath)
+        # with a bundle file, pages aren't saved to separate files
+        pagespath = "" if args.bundlefile else args.pokepagespath
+        if pagespath and not os.path.isdir(pagespath):
+            os.mkdir(pagespath)
         if args.pokepage == "all":
             lst = getname
         else:
             lst = args.pokepage.split(",")
-        for poke in lst:
+
+        # build page of single Pokémon
+        def create_page(poke):
             itname = getname[poke]
             gender, singleMS = get_poke_data(
                 poke, genderdiffs, genderforms, femaleonly, singlemsdata
             )
-            build_poke_page(
+            return build_poke_page(
                 poke,
                 itname,
                 args.pokelistspath,
-                args.pokepagespath,
+                pagespath,
                 artsources,
                 goforms,
                 args.exceptionspath,
@@ -94,6 +108,24 @@ def main():
                 getfrname[itname],
             )
 
+        # read exception files once, before forking workers
+        report_unmatched_exceptions(args.exceptionspath, getname)
+        if args.bundlefile:
+            # append each page to bundle as soon as it's built, in pagefromfile
+            # format, so that all pages can be uploaded by a single process
+            with open(args.bundlefile, "w") as bundle:
+
+                def add_to_bundle(poke, pagetext):
+                    bundle.write(f"{{{{-start-}}}}\n'''{getname[poke]}/Immagini'''\n{pagetext}{{{{-stop-}}}}\n")  # fmt: skip
+                    bundle.flush()
+
+                failed = run_for_pokes(create_page, list(lst), args.jobs, add_to_bundle)
+        else:
+            failed = run_for_pokes(create_page, list(lst), args.jobs)
+        # pages of other Pokémon are still created, but the run is reported as failed
+        if failed:
+            exit(1)
+
 
 # invoke main function
 if __name__ == "__main__":
@@ -1,6 +1,13 @@
-import pywikibot, argparse, os, os.path, re
-from scripts.userscripts.pkimgstools import import_ndex
-from pywikibot import pagegenerators
+import pywikibot, argparse, os, os.path, re, sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from scripts.userscripts.pkimgstools import (
+    import_ndex,
+    import_with_snapshot,
+    get_titles_batch_size,
+    get_pages_texts,
+)
+from pywikibot.data import api
 
 """
 - poke is Pokédex number with leading zeros and without form abbr
@@ -17,42 +24,275 @@ ndexabbr = '37A'
 # pwb pkimgs-data --catlist all --pokelist all --pokerank all --download all
 
 
-# get list of images in given category and save it to text file
-def build_cat_list(site, cat_name, cats_path):
-    pages = pagegenerators.CategorizedPageGenerator(
-        pywikibot.Category(site, f"Categoria:{cat_name}"), recurse=True
+"""
+Category lists are kept in a local SQLite database, so that they can be refreshed
+incrementally instead of downloading all categories every time:
+- categories: all categories (recursively) in each root category listed in
+cats.txt, with their position in a depth-first visit of the tree.
+- members: non-recursive members of each category, with their sortkey.
+- subcats: direct subcategories of each category, to notice changes of the trees.
+- syncs: sync watermark of each root category, i.e. server time at last sync.
+A root category is fully enumerated the first time (or when its watermark is
+too old for recent changes); otherwise only files and categories that appear in
+recent changes since watermark are checked again. Text files in catlistspath are
+then written from the database.
+"""
+CATS_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (root TEXT, category TEXT, position INTEGER, PRIMARY KEY (root, category));
+CREATE TABLE IF NOT EXISTS members (category TEXT, title TEXT, sortkey TEXT, PRIMARY KEY (category, title));
+CREATE INDEX IF NOT EXISTS members_title ON members (title);
+CREATE TABLE IF NOT EXISTS subcats (category TEXT, subcat TEXT, PRIMARY KEY (category, subcat));
+CREATE TABLE IF NOT EXISTS syncs (root TEXT PRIMARY KEY, synced TEXT);
+"""
+
+
+# open database with category lists, creating tables if needed
+def open_cats_db(dbpath):
+    db = sqlite3.connect(dbpath)
+    db.executescript(CATS_DB_SCHEMA)
+    return db
+
+
+# remove namespace from title returned by API
+def strip_ns(item):
+    return item["title"].split(":", 1)[1] if item["ns"] != 0 else item["title"]
+
+
+# get direct members of given category (titles only, as many as API allows per
+# request) split in subcategories and other pages, the latter with their sortkeys
+def get_cat_members(site, cat_name):
+    members = api.ListGenerator(
+        "categorymembers",
+        site=site,
+        parameters={
+            "cmtitle": f"Categoria:{cat_name}",
+            "cmprop": "title|sortkey",
+            "cmtype": "page|subcat|file",
+        },
     )
-    cat_file_path = f'{os.path.join(cats_path, cat_name.replace(":", ";"))}.txt'
+    subcats = []
+    pages = []
+    for item in members:
+        if item["ns"] == 14:
+            subcats.append(strip_ns(item))
+        else:
+            pages.append((strip_ns(item), item["sortkey"]))
+    return subcats, pages
+
+
+# replace stored direct members and subcategories of given category, return its
+# subcategories
+def update_cat_members(db, site, cat_name):
+    subcats, pages = get_cat_members(site, cat_name)
+    db.execute("DELETE FROM members WHERE category = ?", (cat_name,))
+    db.executemany(
+        "INSERT INTO members (category, title, sortkey) VALUES (?, ?, ?)",
+        [(cat_name, title, sortkey) for title, sortkey in pages],
+    )
+    db.execute("DELETE FROM subcats WHERE category = ?", (cat_name,))
+    db.executemany(
+        "INSERT OR IGNORE INTO subcats (category, subcat) VALUES (?, ?)",
+        [(cat_name, subcat) for subcat in subcats],
+    )
+    return subcats
+
+
+# enumerate given root category and all its subcategories from scratch
+def full_sync_cat(db, site, root):
+    db.execute("DELETE FROM categories WHERE root = ?", (root,))
+    visited = []
+    stack = [root]
+    while stack:
+        cat_name = stack.pop()
+        if cat_name in visited:
+            continue
+        visited.append(cat_name)
+        subcats = update_cat_members(db, site, cat_name)
+        stack += reversed(subcats)
+    db.executemany(
+        "INSERT INTO categories (root, category, position) VALUES (?, ?, ?)",
+        [(root, cat_name, position) for position, cat_name in enumerate(visited)],
+    )
+
+
+# Get what changed in File and Category namespaces since given timestamp: files
+# that were uploaded, edited, created, deleted or moved (both old and new title)
+# and categories whose members changed.
+def get_recent_changes(site, since, until):
+    files = set()
+    cats = set()
+    changes = api.ListGenerator(
+        "recentchanges",
+        site=site,
+        parameters={
+            "rcstart": since.isoformat(),
+            "rcend": until.isoformat(),
+            "rcdir": "newer",
+            "rcnamespace": "6|14",
+            "rctype": "edit|new|log|categorize",
+            "rcprop": "title|loginfo",
+        },
+    )
+    for change in changes:
+        if change["ns"] == 14:
+            cats.add(strip_ns(change))
+        else:
+            files.add(strip_ns(change))
+            target = change.get("logparams", {}).get("target_title", "")
+            if target.startswith("File:"):
+                files.add(target.split(":", 1)[1])
+    return files, cats
+
+
+# get current categories (with sortkeys) of given files, in batched queries;
+# deleted and moved files have no categories
+def get_files_cats(site, titles):
+    files_cats = {title: [] for title in titles}
+    titles = sorted(titles)
+    batch_size = get_titles_batch_size(site)
+    for i in range(0, len(titles), batch_size):
+        batch = [f"File:{title}" for title in titles[i : i + batch_size]]
+        pages = api.PropertyGenerator(
+            "categories",
+            site=site,
+            parameters={"titles": "|".join(batch), "clprop": "sortkey"},
+        )
+        for page in pages:
+            cats = [(strip_ns(cat), cat["sortkey"]) for cat in page.get("categories", [])]  # fmt: skip
+            files_cats[strip_ns(page)] = cats
+    return files_cats
+
+
+# Apply recent changes to given root categories, return roots that need a full
+# sync because subcategories were added to or removed from their tree.
+def incremental_sync_cats(db, site, roots, since, until):
+    files, cats = get_recent_changes(site, since, until)
+    tree = db.execute(f"SELECT root, category FROM categories WHERE root IN ({','.join('?' * len(roots))})", roots)  # fmt: skip
+    cat_roots = {}
+    for root, cat_name in tree:
+        cat_roots.setdefault(cat_name, []).append(root)
+    full_roots = set()
+    # categories whose members changed (e.g. because of a template) are enumerated again
+    for cat_name in cats & cat_roots.keys():
+        old_subcats = db.execute("SELECT subcat FROM subcats WHERE category = ?", (cat_name,))  # fmt: skip
+        old_subcats = {subcat for (subcat,) in old_subcats}
+        subcats = update_cat_members(db, site, cat_name)
+        # a subcategory may be added even if it's already in the tree of another
+        # root, so subcategories are compared with stored ones of this category
+        if set(subcats) != old_subcats:
+            full_roots.update(cat_roots[cat_name])
+    # changed files are assigned to categories they are currently in
+    for title, file_cats in get_files_cats(site, files).items():
+        old_cats = db.execute("SELECT category FROM members WHERE title = ?", (title,)).fetchall()  # fmt: skip
+        db.executemany(
+            "DELETE FROM members WHERE category = ? AND title = ?",
+            [(cat, title) for (cat,) in old_cats if cat in cat_roots],
+        )
+        db.executemany(
+            "INSERT OR REPLACE INTO members (category, title, sortkey) VALUES (?, ?, ?)",
+            [(cat, title, sortkey) for cat, sortkey in file_cats if cat in cat_roots],
+        )
+    return full_roots
+
+
+# write list of images in given root category (recursively) to text file
+def write_cat_list(db, root, cats_path):
+    titles = db.execute(
+        "SELECT m.title FROM categories c JOIN members m ON m.category = c.category "
+        "WHERE c.root = ? ORDER BY c.position, m.sortkey, m.title",
+        (root,),
+    )
+    # dicts keep insertion order, so they are used as ordered sets
+    titles = dict.fromkeys(row[0] for row in titles)
+    cat_file_path = f'{os.path.join(cats_path, root.replace(":", ";"))}.txt'
     with open(cat_file_path, "w", encoding="utf8") as file:
-        file.write("\n".join([page.title(with_ns=False) for page in pages]) + "\n")
-
-
-# get list of images in given category with given Pokémon
-def get_poke_in_cat(poke, name, cat, catspath):
-    # search ndex or name
-    # do note that Stadium 2 models are Sprstad2<ndex>, so \D{}\D won't find them
-    regex = r"({}\D|\b{}\b)".format(poke, name)
-    with open(os.path.join(catspath, cat.replace(":", ";")), "r") as catfile:
-        lines = catfile.read().splitlines()
-    lst = []
-    for line in lines:
-        if re.search(regex, line) and line not in lst:
-            lst.append(line)
-    return lst
-
-
-# get list of images for given Pokémon and save it to text file
-def build_poke_list(poke, name, catspath, pokelistspath):
-    # imgs is the union of all lists, imgs_distinct the final list without duplicates
-    imgs = []
-    imgs_distinct = []
+        file.write("\n".join(titles) + "\n")
+
+
+# Update lists of images in given root categories and save them to text files;
+# roots never synced, synced before maxage or all roots if full is True are
+# fully enumerated, the others are updated from recent changes.
+def build_cat_lists(site, roots, dbpath, cats_path, maxage, full=False):
+    db = open_cats_db(dbpath)
+    until = site.server_time()
+    synced = dict(db.execute("SELECT root, synced FROM syncs"))
+    full_roots = set()
+    incremental_roots = []
+    for root in roots:
+        since = synced.get(root)
+        if full or not since:
+            full_roots.add(root)
+        elif pywikibot.Timestamp.fromISOformat(since) < until - timedelta(days=maxage):  # fmt: skip
+            full_roots.add(root)
+        else:
+            incremental_roots.append(root)
+    if incremental_roots:
+        since = min(pywikibot.Timestamp.fromISOformat(synced[root]) for root in incremental_roots)  # fmt: skip
+        full_roots |= incremental_sync_cats(db, site, incremental_roots, since, until)
+    for root in roots:
+        if root in full_roots:
+            full_sync_cat(db, site, root)
+        db.execute("INSERT OR REPLACE INTO syncs (root, synced) VALUES (?, ?)", (root, until.isoformat()))  # fmt: skip
+        db.commit()
+        write_cat_list(db, root, cats_path)
+        mode = "full" if root in full_roots else "incremental"
+        print(f'Retrieved list of images in category "{root}" ({mode} sync)')
+    db.close()
+
+
+# Index names by their leading word, so that a word found in an image name leads
+# directly to the names that may match there: \b{name}\b can only start where a
+# word starts, and since the leading word of a name is followed by a literal
+# non-word character (or by nothing) it must be the whole word found in image name.
+# Names whose leading word is followed by a regex metacharacter (e.g. "Mr. Mime")
+# can't be indexed this way, so they are checked on every image name.
+def build_names_index(names):
+    names_index = {}
+    unindexed_names = []
+    for poke, name in names.items():
+        name_regex = re.compile(r"\b{}\b".format(name))
+        key = re.match(r"\w+", name)
+        if key and (key.end() == len(name) or name[key.end()] not in ".^$*+?{}[]\\|()"):  # fmt: skip
+            names_index.setdefault(key.group(0), []).append((poke, name_regex))
+        else:
+            unindexed_names.append((poke, name_regex))
+    return names_index, unindexed_names
+
+
+# Get all Pokémon in given image name, that is all pokes whose ndex is followed by
+# a non-digit or whose name is a whole word, like ({poke}\D|\b{name}\b) would find.
+# Only last 4 digits of a number followed by a non-digit can match a poke, which
+# is exactly what the ndex regex extracts.
+def get_pokes_in_img(img, pokes, names_index, unindexed_names):
+    found = {poke for poke in re.findall(r"(\d{4})(?=\D)", img) if poke in pokes}
+    for word in re.findall(r"\w+", img):
+        for poke, name_regex in names_index.get(word, []):
+            if poke not in found and name_regex.search(img):
+                found.add(poke)
+    for poke, name_regex in unindexed_names:
+        if poke not in found and name_regex.search(img):
+            found.add(poke)
+    return found
+
+
+# Get list of images for given Pokémon and save them to text files: all category
+# files are read only once and each image is assigned to all Pokémon it contains,
+# so that time is linear in the number of images instead of images × Pokémon.
+# Images are listed in the same order as they appear in category files (which are
+# read in os.listdir order), without duplicates.
+def build_poke_lists(names, catspath, pokelistspath):
+    names_index, unindexed_names = build_names_index(names)
+    pokes_imgs = {poke: {} for poke in names}
     for cat in os.listdir(catspath):
-        imgs += get_poke_in_cat(poke, name, cat, catspath)
-    for img in imgs:
-        if img not in imgs_distinct:
-            imgs_distinct.append(img)
-    with open(f"{os.path.join(pokelistspath, poke)}.txt", "w") as file:
-        file.write("\n".join(imgs_distinct) + "\n")
+        with open(os.path.join(catspath, cat.replace(":", ";")), "r") as catfile:
+            lines = catfile.read().splitlines()
+        for line in lines:
+            for poke in get_pokes_in_img(line, pokes_imgs, names_index, unindexed_names):  # fmt: skip
+                # dicts keep insertion order, so they are used as ordered sets
+                pokes_imgs[poke][line] = None
+    for poke, imgs in pokes_imgs.items():
+        with open(f"{os.path.join(pokelistspath, poke)}.txt", "w") as file:
+            file.write("\n".join(imgs) + "\n")
 
 
 # get number of images for given Pokémon
@@ -62,12 +302,48 @@ def get_poke_rank(poke, pokespath):
     return len(lines)
 
 
-# download wikicode of pokepage from wiki and save it to text file
-def download_pokepage(site, poke, name, downloadspath):
-    destfile = os.path.join(downloadspath, "{}.txt".format(poke))
-    page = pywikibot.Page(site, "{}/Immagini".format(name))
-    with open(destfile, "w") as file:
-        file.write(page.text.strip() + "\n")
+# get last revision id of given pages (0 if missing), in batched queries
+def get_pages_revids(site, titles, batch_size):
+    revids = {}
+    for i in range(0, len(titles), batch_size):
+        pages = api.PropertyGenerator(
+            "info",
+            site=site,
+            parameters={"titles": "|".join(titles[i : i + batch_size])},
+        )
+        for page in pages:
+            revids[page["title"]] = page.get("lastrevid", 0)
+    return revids
+
+
+# Download wikicode of pokepages from wiki and save it to text files, together with
+# revid of downloaded revision in <poke>.revid files. Pages whose last revid is the
+# same as local one are skipped; the others are downloaded in batched queries run
+# by a bounded pool of workers (API throttle is handled by pywikibot).
+def download_pokepages(site, names, downloadspath, workers):
+    batch_size = get_titles_batch_size(site)
+    # normalize titles like API does, to find them in API results
+    titles = {pywikibot.Page(site, f"{name}/Immagini").title(): poke for poke, name in names.items()}  # fmt: skip
+    revids = get_pages_revids(site, list(titles), batch_size)
+    outdated = []
+    for title, poke in titles.items():
+        revidfile = os.path.join(downloadspath, f"{poke}.revid")
+        textfile = os.path.join(downloadspath, f"{poke}.txt")
+        if os.path.isfile(revidfile) and os.path.isfile(textfile):
+            with open(revidfile, "r") as file:
+                if file.read().strip() == str(revids.get(title, 0)):
+                    continue
+        outdated.append(title)
+    batches = [outdated[i : i + batch_size] for i in range(0, len(outdated), batch_size)]  # fmt: skip
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for texts in executor.map(lambda batch: get_pages_texts(site, batch), batches):
+            for title, (revid, text) in texts.items():
+                poke = titles[title]
+                with open(os.path.join(downloadspath, f"{poke}.txt"), "w") as file:
+                    file.write(text.strip() + "\n")
+                with open(os.path.join(downloadspath, f"{poke}.revid"), "w") as file:
+                    file.write(f"{revid}\n")
+    print(f"Downloaded {len(outdated)} pages, {len(titles) - len(outdated)} unchanged")
 
 
 # main function
@@ -78,18 +354,25 @@ def main():
     parser.add_argument("--lang", default="it")
     parser.add_argument("--catlist", default="")
     parser.add_argument("--catlistspath", default="data/pokepages-catlists/")
+    parser.add_argument("--catlistsdb", default="data/pokepages-catlists.sqlite")
+    parser.add_argument("--catlistsfull", default="no")
+    parser.add_argument("--catlistsmaxage", type=int, default=30)
     parser.add_argument("--pokelist", default="")
     parser.add_argument("--pokelistspath", default="data/pokepages-pokelists/")
     parser.add_argument("--pokerank", default="")
     parser.add_argument("--pokerankfile", default="data/ranking.txt")
     parser.add_argument("--catsfile", default="data/pokepages-utils/cats.txt")
     parser.add_argument("--dexfile", default="data/wiki-util-data/poke-names.json")
+    parser.add_argument("--snapshotfile", default="data/pokepages-snapshot.pickle")
     parser.add_argument("--download", default="")
     parser.add_argument("--downloadspath", default="data/pokepages-downloaded/")
+    parser.add_argument("--downloadworkers", type=int, default=4)
     args = parser.parse_args()
     # import data
     site = pywikibot.Site(args.lang, fam=args.fam)
-    getname, _, _, _, _ = import_ndex(args.dexfile)
+    getname, _, _, _, _ = import_with_snapshot(
+        args.snapshotfile, import_ndex, args.dexfile
+    )
     # update categories
     if args.catlist:
         if not os.path.isdir(args.catlistspath):
@@ -97,12 +380,10 @@ def main():
         if args.catlist == "all":
             with open(args.catsfile, "r", encoding="utf8") as file:
                 allcats = file.read().splitlines()
-            for cat in allcats:
-                build_cat_list(site, cat, args.catlistspath)
-                print(f'Retrieved list of images in category "{cat}"')
         else:
-            build_cat_list(site, args.catlist, args.catlistspath)
-            print(f'Retrieved list of images in category "{args.catlist}"')
+            allcats = [args.catlist]
+        full = args.catlistsfull.lower().strip() == "yes"
+        build_cat_lists(site, allcats, args.catlistsdb, args.catlistspath, args.catlistsmaxage, full)  # fmt: skip
     # update lists of images
     if args.pokelist:
         if not os.path.isdir(args.pokelistspath):
@@ -111,8 +392,8 @@ def main():
             lst = getname
         else:
             lst = args.pokelist.split(",")
-        for poke in lst:
-            build_poke_list(poke, getname[poke], args.catlistspath, args.pokelistspath)
+        names = {poke: getname[poke] for poke in lst}
+        build_poke_lists(names, args.catlistspath, args.pokelistspath)
         print(f"Updated {args.pokelistspath}")
     # count number of images for given Pokémon or for all Pokémon
     if args.pokerank:
@@ -143,8 +424,8 @@ def main():
         if not os.path.isdir(args.downloadspath):
             os.mkdir(args.downloadspath)
         # retrieve subpages
-        for poke in lst:
-            download_pokepage(site, poke, getname[poke], args.downloadspath)
+        names = {poke: getname[poke] for poke in lst}
+        download_pokepages(site, names, args.downloadspath, args.downloadworkers)
 
 
 # invoke main function
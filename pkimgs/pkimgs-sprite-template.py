@@ -1,4 +1,5 @@
 import argparse, json, re, pywikibot
+from pywikibot import pagegenerators
 
 
 # main function
@@ -21,6 +22,11 @@ def main():
         f"{ndexabbr.zfill(4 + len(re.sub(r"\d", "", ndexabbr)))}"
         for ndexabbr in forms_data
     ]
+    # index data by Pokémon, and forms by Pokémon they belong to (in original order)
+    pokes_index = {item["poke"]: item for item in pokes_data}
+    forms_index = {}
+    for form in forms:
+        forms_index.setdefault(re.match(r"\d+", form).group(0), []).append(form)
     with open(args.genderfile, "r") as file:
         gender_data = json.load(file)
     site = pywikibot.Site()
@@ -29,12 +35,14 @@ def main():
         pokes = [item["poke"] for item in pokes_data]
     else:
         pokes = args.updatepoke.split(",")
-    # process desired Pokémon pages
-    for poke in pokes:
-        poke_data = [item for item in pokes_data if item["poke"] == poke][0]
+    # process desired Pokémon pages, loading their text in batches
+    pages = [pywikibot.Page(site, pokes_index[poke]["it"]) for poke in pokes]
+    title_to_poke = {page.title(): poke for page, poke in zip(pages, pokes)}
+    for page in pagegenerators.PreloadingGenerator(pages):
+        poke = title_to_poke[page.title()]
+        poke_data = pokes_index[poke]
         poke_name = poke_data["it"]
         ndex = poke_data["ndex"]
-        page = pywikibot.Page(site, poke_name)
         # ensure that Sprite template is included in page (even if disabled)
         if not re.search(r"\{\{[Ss]prite\b", page.text):
             print(f"Cannot update #{poke} {poke_name}: Sprite template not found")
@@ -44,7 +52,7 @@ def main():
         gender_diff = str(ndex) in gender_data["gender-diffs"]
         gender_form = str(ndex) in gender_data["gender-forms"]
         # count Pokémon forms and ignore them if more than 5
-        pokeabbrs = [form for form in forms if form.startswith(poke)]
+        pokeabbrs = forms_index.get(poke, [])
         if len(pokeabbrs) > 5:
             pokeabbrs = []
         # remove first abbr if gender difference treated as useless form
@@ -1,5 +1,7 @@
-import pywikibot, argparse, os.path
-from scripts.userscripts.pkimgstools import import_ndex, import_data, get_poke_data, get_poke_forms, get_spinoff_imgs, build_arts, build_main, build_spinoffs  # fmt: skip
+import pywikibot, argparse, os.path, re, json, hashlib, time
+from scripts.userscripts.pkimgstools import import_ndex, import_data, import_with_snapshot, get_poke_data, get_poke_forms, get_spinoff_imgs, build_arts, build_main, build_spinoffs, get_poke_exceptions, call_cached, report_unmatched_exceptions, run_for_pokes, get_pages_texts  # fmt: skip
+from pywikibot.exceptions import MaxlagTimeoutError
+
 """
 Quick infos about variables:
 - poke is Pokédex number with leading zeros and without form abbr
@@ -15,86 +17,209 @@ ndexabbr = '37A'
 """
 
 
-# get text for given section (artworks, main series or spin-offs)
-def get_section_text(pagetext, delimiters, section):
-    start, end = delimiters[section]
-    index1 = pagetext.index(start) + len(start)
-    index2 = pagetext.index(end)
-    return pagetext[index1:index2]
+# delimiters of sections (artworks, main series and spin-offs), in page order
+section_delimiters = {
+    "artwork": [
+        "==Artwork==\n{{pokemonimages/head|content=\n",
+        "}}\n\n==Sprite e modelli==",
+    ],
+    "main": [
+        "===Serie principale===\n{{pokemonimages/head|content=\n",
+        "}}\n\n===Spin-off===",
+    ],
+    "spinoff": [
+        "===Spin-off===\n{{pokemonimages/head|content=\n",
+        "}}\n\n[[Categoria:Sottopagine immagini Pokémon]]",
+    ],
+}
+# dividers that end generated part of artworks section, followed by manual entries
+artwork_dividers = re.compile("|".join(re.escape(f"{{{{pokemonimages/div|text={text}}}}}") for text in ["Altri", "[[Pokédex Rotom]]", "[[Lugia Ombra]]", "[[Dialga Oscuro]]", "[[Zygarde/Forme|Cellula]]"]))  # fmt: skip
+
+
+# Get offsets of content of all sections as {section: [start, end]}, scanning page
+# once: each delimiter is searched only after the previous one, so that the same
+# text elsewhere in the page can't be mistaken for it
+def split_sections(pagetext):
+    spans = {}
+    offset = 0
+    for section, (start, end) in section_delimiters.items():
+        index1 = pagetext.index(start, offset) + len(start)
+        index2 = pagetext.index(end, index1)
+        if section == "artwork":
+            divider = artwork_dividers.search(pagetext, index1, index2)
+            if divider:
+                index2 = divider.start()
+        spans[section] = [index1, index2]
+        offset = index2
+    return spans
+
 
+# replace content of sections given as {section: newtext} with a single join
+def join_sections(pagetext, spans, newtexts):
+    pieces = []
+    offset = 0
+    for section, (index1, index2) in spans.items():
+        if section in newtexts:
+            pieces += [pagetext[offset:index1], newtexts[section]]
+            offset = index2
+    pieces.append(pagetext[offset:])
+    return "".join(pieces)
 
-# update page (all section or given one) and check if it was actually modified
-# in that case save it to new text file
-def update_page(poke, name, gender, forms, pokelistspath, artsources, singleMS, availpokes, availforms, rangerdata, goforms, exceptionspath, section, downloadspath, updatespath):  # fmt: skip
+
+# Update page (all section or given one) and check if it was actually modified
+# in that case save it to new text file. Sections are cached in sectioncachepath
+# with a hash of their inputs, and reused if inputs didn't change since last run.
+# Return number of sections rebuilt and read from cache.
+def update_page(poke, name, gender, forms, pokelistspath, artsources, singleMS, availpokes, availforms, rangerdata, goforms, exceptionspath, section, downloadspath, updatespath, sectioncachepath):  # fmt: skip
+    counts = {"rebuilt": 0, "cached": 0}
     # get list of abbrs without duplicates
     abbrs = list(dict.fromkeys([form[0] for form in forms]))
     localfile = os.path.join(downloadspath, f"{poke}.txt")
     if not os.path.isfile(localfile):
         print(f'File "{localfile}" not found, skipping it.')
-        return
+        return counts
     with open(localfile, "r") as file:
         pagetext = file.read()
     if not pagetext.strip():
-        return
+        return counts
     with open(f"{os.path.join(pokelistspath, poke)}.txt", "r") as pokefile:
         imgs = pokefile.read().splitlines()
-    edited = False
-    delimiter_artworks_end = "}}\n\n==Sprite e modelli=="
-    delimiters = {
-        "artwork": [
-            "==Artwork==\n{{pokemonimages/head|content=\n",
-            delimiter_artworks_end,
-        ],
-        "main": [
-            "===Serie principale===\n{{pokemonimages/head|content=\n",
-            "}}\n\n===Spin-off===",
-        ],
-        "spinoff": [
-            "===Spin-off===\n{{pokemonimages/head|content=\n",
-            "}}\n\n[[Categoria:Sottopagine immagini Pokémon]]",
-        ],
-    }
-    if delimiters["main"][1] not in pagetext:
-        pagetext = pagetext.replace(delimiters["spinoff"][1], "}}\n\n" + delimiters["spinoff"][0] + "<!--[PLACEHOLDER]-->" + delimiters["spinoff"][1])  # fmt: skip
-    exceptions = ["Altri", "[[Pokédex Rotom]]", "[[Lugia Ombra]]", "[[Dialga Oscuro]]", "[[Zygarde/Forme|Cellula]]"]  # fmt: skip
-    for exception in exceptions:
-        delimiter = f"{{{{pokemonimages/div|text={exception}}}}}"
-        if delimiter in pagetext:
-            delimiters.update({"artwork": ["==Artwork==\n{{pokemonimages/head|content=\n", delimiter],})  # fmt: skip
+    # cached sections, and data they depend on besides images
+    cachefile = os.path.join(sectioncachepath, f"{poke}.json") if sectioncachepath else ""  # fmt: skip
+    cache = {}
+    if cachefile and os.path.isfile(cachefile):
+        with open(cachefile, "r") as file:
+            cache = json.load(file)
+    ndex = int(poke)
+    pokeavail = {game: str(ndex) in ndexes for game, ndexes in availpokes.items()}
+    formsavail = {abbr: availforms[f"{ndex}{abbr}"] for abbr in abbrs if abbr}
+    pokeexceptions = get_poke_exceptions(exceptionspath, poke)
+    # add empty spin-off section if missing
+    if section_delimiters["main"][1] not in pagetext:
+        start, end = section_delimiters["spinoff"]
+        index = pagetext.index(end)
+        pagetext = f"{pagetext[:index]}}}}}\n\n{start}<!--[PLACEHOLDER]-->{pagetext[index:]}"  # fmt: skip
+    spans = split_sections(pagetext)
+    # new text of sections that changed
+    newtexts = {}
     if section in ["artwork", "all"]:
         divider = "{{pokemonimages/div|text=Altri}}"
-        oldtext = get_section_text(pagetext, delimiters, "artwork")
+        oldtext = pagetext[slice(*spans["artwork"])]
         arts = [img for img in imgs if img.startswith("Artwork")]
         extras = divider not in pagetext
-        newtext, extrastext = build_arts(poke, arts, abbrs, gender, artsources, extras, pagetext)  # fmt: skip
+        inputs = [arts, abbrs, gender, artsources, extras, pagetext]
+        (newtext, extrastext), cached = call_cached(cache, "artwork", inputs, build_arts, poke, arts, abbrs, gender, artsources, extras, pagetext)  # fmt: skip
+        counts["cached" if cached else "rebuilt"] += 1
         if newtext != oldtext:
-            pagetext = pagetext.replace(oldtext, newtext)
-            edited = True
+            newtexts["artwork"] = newtext
         # ------ disabled for the moment
         # if extrastext and not extras:
         #     if divider in pagetext:
         #         extrastext = extrastext.replace(f"\n{divider}\n", "")
-        #     index = pagetext.find(delimiter_artworks_end)
+        #     index = pagetext.find(section_delimiters["artwork"][1])
         #     if index > 0:
         #         pagetext = pagetext[:index] + extrastext + pagetext[index:]
         #         edited = True
     if section in ["main", "all"]:
-        oldtext = get_section_text(pagetext, delimiters, "main")
-        newtext = build_main(poke, exceptionspath, forms, gender, singleMS, availpokes, availforms, imgs)  # fmt: skip
+        oldtext = pagetext[slice(*spans["main"])]
+        inputs = [forms, gender, singleMS, pokeavail, formsavail, imgs, pokeexceptions]
+        newtext, cached = call_cached(cache, "main", inputs, build_main, poke, exceptionspath, forms, gender, singleMS, availpokes, availforms, imgs)  # fmt: skip
+        counts["cached" if cached else "rebuilt"] += 1
         if newtext != oldtext:
-            pagetext = pagetext.replace(oldtext, newtext)
-            edited = True
+            newtexts["main"] = newtext
     if section in ["spinoff", "all"]:
-        oldtext = get_section_text(pagetext, delimiters, "spinoff")
+        oldtext = pagetext[slice(*spans["spinoff"])]
         spinoffimages = get_spinoff_imgs(imgs)
-        newtext = build_spinoffs(poke, name, gender, abbrs, spinoffimages, rangerdata, goforms, exceptionspath)  # fmt: skip
+        inputs = [name, gender, abbrs, spinoffimages, rangerdata, goforms, pokeexceptions]  # fmt: skip
+        newtext, cached = call_cached(cache, "spinoff", inputs, build_spinoffs, poke, name, gender, abbrs, spinoffimages, rangerdata, goforms, exceptionspath)  # fmt: skip
+        counts["cached" if cached else "rebuilt"] += 1
         if newtext != oldtext:
-            pagetext = pagetext.replace(oldtext, newtext)
-            edited = True
-    if edited:
+            newtexts["spinoff"] = newtext
+    if newtexts:
+        pagetext = join_sections(pagetext, spans, newtexts)
         destfile = os.path.join(updatespath, f"{poke}.txt")
         with open(destfile, "w") as file:
             file.write(pagetext)
+    if cachefile and counts["rebuilt"]:
+        with open(cachefile, "w") as file:
+            json.dump(cache, file)
+    return counts
+
+
+# read upload journal as {page file: SHA-1 of uploaded text}; each line contains
+# page file, wiki title, revid and SHA-1 separated by tabs, last line of a file wins
+def read_upload_journal(journalfile):
+    journal = {}
+    if os.path.isfile(journalfile):
+        with open(journalfile, "r") as file:
+            for line in file:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) == 4:
+                    journal[fields[0]] = fields[3]
+    return journal
+
+
+# Upload given page files to wiki. Each saved page is written to journalfile, and
+# pages whose current text is in the journal are skipped, so that an interrupted
+# upload can be resumed by running it again; pages whose wiki text is already the
+# same as local one are skipped too. Pace is set by pywikibot throttle, which waits
+# for put_throttle, maxlag and Retry-After; if maxlag retries run out, the page is
+# retried after an increasing pause. Edits per minute and throttle waits are printed.
+def upload_pages(site, pages, updatespath, getname, summary, journalfile, maxlagretries):  # fmt: skip
+    start = time.time()
+    # time spent waiting by throttle, all waits go through its wait function
+    waited = [0.0]
+    throttle_wait = site.throttle.wait
+
+    def timed_wait(seconds):
+        waited[0] += max(seconds, 0)
+        throttle_wait(seconds)
+
+    site.throttle.wait = timed_wait
+    # read local pages, skipping those already uploaded
+    journal = read_upload_journal(journalfile)
+    texts = {}
+    for pokepage in pages:
+        with open(os.path.join(updatespath, pokepage), "r") as file:
+            text = file.read()
+        sha1 = hashlib.sha1(text.encode()).hexdigest()
+        if journal.get(pokepage) != sha1:
+            title = pywikibot.Page(site, f'{getname[pokepage.replace(".txt", "")]}/Immagini').title()  # fmt: skip
+            texts[pokepage] = (title, text, sha1)
+    resumed = len(pages) - len(texts)
+    # get current text of all pages, to skip those that are already up to date
+    wikitexts = get_pages_texts(site, [title for title, _, _ in texts.values()])
+    saved = identical = 0
+    try:
+        with open(journalfile, "a") as journal_file:
+            for pokepage, (title, text, sha1) in texts.items():
+                revid, wikitext = wikitexts.get(title, (0, ""))
+                # wiki removes trailing whitespace when saving
+                if wikitext.rstrip() == text.rstrip():
+                    identical += 1
+                else:
+                    wikipage = pywikibot.Page(site, title)
+                    wikipage.text = text
+                    for retry in range(maxlagretries + 1):
+                        try:
+                            wikipage.save(summary)
+                            break
+                        except MaxlagTimeoutError:
+                            if retry == maxlagretries:
+                                raise
+                            pause = 60 * 2**retry
+                            print(f"Server lagged, retrying {title} in {pause} seconds")
+                            timed_wait(pause)
+                    revid = wikipage.latest_revision_id
+                    saved += 1
+                journal_file.write(f"{pokepage}\t{title}\t{revid}\t{sha1}\n")
+                journal_file.flush()
+    finally:
+        site.throttle.wait = throttle_wait
+    minutes = (time.time() - start) / 60
+    rate = saved / minutes if minutes else 0
+    print(f"Saved {saved} pages ({rate:.1f} edits/min), {identical} already up to date, {resumed} already uploaded according to journal")  # fmt: skip
+    print(f"Time spent waiting for throttle: {waited[0]:.1f} s of {minutes * 60:.1f} s")
 
 
 # main function
@@ -120,12 +245,19 @@ def main():
     parser.add_argument("--updatepoke", default="")
     parser.add_argument("--section", default="all")
     parser.add_argument("--updatespath", default="data/pokepages-updated/")
+    parser.add_argument("--sectioncachepath", default="data/pokepages-sectioncache/")
     parser.add_argument("--upload", default="")
     parser.add_argument("--summary", default="Bot: updating Pokémon subpages")
+    parser.add_argument("--uploadjournal", default="data/pokepages-upload-journal.txt")
+    parser.add_argument("--maxlagretries", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--snapshotfile", default="data/pokepages-snapshot.pickle")
     # fmt: on
     args = parser.parse_args()
     # import data
-    getname, _, _, _, _ = import_ndex(args.dexfile)
+    getname, _, _, _, _ = import_with_snapshot(
+        args.snapshotfile, import_ndex, args.dexfile
+    )
     (
         genderdiffs,
         genderforms,
@@ -136,7 +268,9 @@ def main():
         availforms,
         rangerdata,
         goforms,
-    ) = import_data(
+    ) = import_with_snapshot(
+        args.snapshotfile,
+        import_data,
         args.genderdatafile,
         args.artsourcesfile,
         args.singlemsfile,
@@ -148,15 +282,20 @@ def main():
     # update pages
     if args.updatepoke:
         if args.updatepoke == "all":
-            lst = [poke.replace(".txt", "") for poke in os.listdir(args.downloadspath)]  # fmt: skip
+            # only text files, downloads directory also contains .revid files
+            lst = [poke.replace(".txt", "") for poke in os.listdir(args.downloadspath) if poke.endswith(".txt")]  # fmt: skip
         else:
             lst = args.updatepoke.split(",")
         if not os.path.isdir(args.updatespath):
             os.mkdir(args.updatespath)
-        for poke in lst:
+        if args.sectioncachepath and not os.path.isdir(args.sectioncachepath):
+            os.mkdir(args.sectioncachepath)
+
+        # update page of single Pokémon
+        def update_poke(poke):
             gender, singleMS = get_poke_data(poke, genderdiffs, genderforms, femaleonly, singlemsdata)  # fmt: skip
             forms = get_poke_forms(poke, availforms)
-            update_page(
+            return update_page(
                 poke,
                 getname[poke],
                 gender,
@@ -172,7 +311,19 @@ def main():
                 args.section,
                 args.downloadspath,
                 args.updatespath,
+                args.sectioncachepath,
             )
+
+        # read exception files once, before forking workers
+        report_unmatched_exceptions(args.exceptionspath, getname)
+        results = {}
+        failed = run_for_pokes(update_poke, lst, args.jobs, results.__setitem__)
+        rebuilt = sum(counts["rebuilt"] for counts in results.values())
+        cached = sum(counts["cached"] for counts in results.values())
+        print(f"Sections rebuilt: {rebuilt}, from cache: {cached}")
+        # don't upload pages if any of them couldn't be updated
+        if failed:
+            exit(1)
     # upload pages
     if args.upload:
         if args.upload == "all":
@@ -180,12 +331,7 @@ def main():
         else:
             lst = [f"{page}.txt" for page in args.upload.split(",")]
         site = pywikibot.Site(args.lang, fam=args.fam)
-        for pokepage in lst:
-            localpage = os.path.join(args.updatespath, pokepage)
-            wikipage = pywikibot.Page(site, f'{getname[pokepage.replace(".txt", "")]}/Immagini')  # fmt: skip
-            with open(localpage, "r") as file:
-                wikipage.text = file.read()
-            wikipage.save(args.summary)
+        upload_pages(site, lst, args.updatespath, getname, args.summary, args.uploadjournal, args.maxlagretries)  # fmt: skip
 
 
 # invoke main function
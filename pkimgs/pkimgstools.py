@@ -1,4 +1,4 @@
-import os, os.path, re, json
+import os, os.path, re, json, io, contextlib, multiprocessing, traceback, pickle, hashlib
 from math import floor
 
 """
@@ -63,6 +63,10 @@ convert_game_abbr = {
     "s": "sme",
     "n2b2": "nb2",
 }
+# games of each generation (ignoring middle of generation), in game_to_gen order
+gen_to_games = {}
+for game, gen in game_to_gen.items():
+    gen_to_games.setdefault(int(gen), []).append(game)
 
 
 # 'getname' maps 'poke' to italian name, others map italian name to foreign names
@@ -93,8 +97,9 @@ def import_data(genderdatafile, artsourcesfile, singlemsfile, availpokesfile, av
     femaleonly = genderdata["female-only"]
     with open(artsourcesfile, "r") as file:
         artsources = json.load(file)
+    # lists of ndexes are converted to sets, so that availability checks are O(1)
     with open(availpokesfile, "r") as file:
-        availpokes = json.load(file)
+        availpokes = {game: set(ndexes) for game, ndexes in json.load(file).items()}
     with open(availformsfile, "r") as file:
         availforms = json.load(file)
     with open(singlemsfile, "r") as file:
@@ -106,6 +111,196 @@ def import_data(genderdatafile, artsourcesfile, singlemsfile, availpokesfile, av
     return genderdiffs, genderforms, femaleonly, artsources, singlemsdata, availpokes, availforms, rangerdata, goforms  # fmt: skip
 
 
+# get state of given source files as {path: [mtime, size, SHA-1]}; SHA-1 is taken
+# from known state if mtime and size didn't change, to avoid reading files
+def get_sources_state(files, known_state={}):
+    state = {}
+    for path in files:
+        stat = os.stat(path)
+        known = known_state.get(path)
+        if known and known[:2] == [stat.st_mtime_ns, stat.st_size]:
+            sha1 = known[2]
+        else:
+            with open(path, "rb") as file:
+                sha1 = hashlib.sha1(file.read()).hexdigest()
+        state[path] = [stat.st_mtime_ns, stat.st_size, sha1]
+    return state
+
+
+# SHA-1 of this file, so that results cached by import_with_snapshot and
+# call_cached are discarded when the code that builds them changes
+with open(__file__, "rb") as file:
+    code_hash = hashlib.sha1(file.read()).hexdigest()
+
+
+# Call function (import_ndex or import_data) with given source files, reading
+# its result from a pickle snapshot if source files didn't change since it was
+# saved: files are compared by mtime and size, and by SHA-1 if these changed.
+# Snapshot is also discarded if this file changed since it was saved. Otherwise
+# function is called and snapshot is updated. Snapshot can contain
+# results of multiple functions; if snapshotfile is empty it isn't used at all.
+def import_with_snapshot(snapshotfile, function, *files):
+    if not snapshotfile:
+        return function(*files)
+    key = f"{function.__name__}({','.join(files)})"
+    try:
+        with open(snapshotfile, "rb") as file:
+            snapshot = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        snapshot = {}
+    entry = snapshot.get(key)
+    if entry and entry.get("code") == code_hash:
+        sources = get_sources_state(files, entry["sources"])
+        if sources == entry["sources"]:
+            return entry["data"]
+        # compare hashes only, files may have been touched without changes
+        if all(sources[f][2] == entry["sources"][f][2] for f in files):
+            data = entry["data"]
+        else:
+            data = function(*files)
+    else:
+        sources = get_sources_state(files)
+        data = function(*files)
+    snapshot[key] = {"code": code_hash, "sources": sources, "data": data}
+    # write to temporary file and then replace, so that the snapshot is never
+    # read half-written by another script
+    with open(f"{snapshotfile}.tmp", "wb") as file:
+        pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{snapshotfile}.tmp", snapshotfile)
+    return data
+
+
+# get max number of titles per API query: 500 with apihighlimits right (bots), 50 otherwise
+def get_titles_batch_size(site):
+    return 500 if site.has_right("apihighlimits") else 50
+
+
+# get current wikicode of given pages as {title: (revid, text)}, with one query
+# for each batch of titles; missing pages have revid 0 and empty text
+def get_pages_texts(site, titles):
+    # imported here, so that scripts not using the API don't need pywikibot
+    from pywikibot.data import api
+
+    batch_size = get_titles_batch_size(site)
+    texts = {}
+    for i in range(0, len(titles), batch_size):
+        pages = api.PropertyGenerator(
+            "revisions",
+            site=site,
+            parameters={
+                "titles": "|".join(titles[i : i + batch_size]),
+                "rvprop": "ids|content",
+                "rvslots": "main",
+            },
+        )
+        for page in pages:
+            if page.get("revisions"):
+                revision = page["revisions"][0]
+                main_slot = revision["slots"]["main"]
+                text = main_slot.get("content", main_slot.get("*", ""))
+                texts[page["title"]] = (revision["revid"], text)
+            # pages without revisions may also be split by query continuation
+            elif "missing" in page:
+                texts[page["title"]] = (0, "")
+    return texts
+
+
+# Sections of exception files (<poke>_<section>.txt) read by build_main and
+# build_spinoffs, with Pokédex numbers they are read for (None means all)
+exception_sections = {
+    "main": None,
+    "main3": [386],
+    "mainMS": None,
+    "extraTCG": [25],
+    "extraShuffle": [25],
+    "extraMJ": [129],
+    "extraXD": [249],
+    "extraCM": None,
+}
+# Exception files read by get_exceptions, kept for following calls; they are read
+# again only if folder mtime changes, i.e. when files are added, removed or renamed
+exceptions_registry = {"path": None, "mtime": None, "files": {}, "unparsed": []}
+
+
+# read all exception files in exceptionspath with a single directory listing, as
+# {(poke, section): text}; other files in the folder are listed separately
+def get_exceptions(exceptionspath):
+    try:
+        mtime = os.stat(exceptionspath).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    registry = exceptions_registry
+    if registry["path"] == exceptionspath and registry["mtime"] == mtime:
+        return registry
+    files = {}
+    unparsed = []
+    if mtime is not None:
+        with os.scandir(exceptionspath) as entries:
+            for entry in entries:
+                match = re.fullmatch(r"(\d{4})_(\w+)\.txt", entry.name)
+                if not match:
+                    unparsed.append(entry.name)
+                elif entry.is_file():
+                    with open(entry.path, "r") as file:
+                        files[(match[1], match[2])] = file.read()
+    registry.update(path=exceptionspath, mtime=mtime, files=files, unparsed=unparsed)
+    return registry
+
+
+# get text of exception file of given Pokémon and section, None if it doesn't exist;
+# if required is True a missing file is an error
+def get_exception(exceptionspath, poke, section, required=False):
+    text = get_exceptions(exceptionspath)["files"].get((poke, section))
+    if text is None and required:
+        filename = os.path.join(exceptionspath, f"{poke}_{section}.txt")
+        raise FileNotFoundError(f"Missing exception file {filename}")
+    return text
+
+
+# print exception files that are never read for any of given Pokémon: unknown
+# Pokémon or section, section not used for that Pokémon or hidden by another file
+def report_unmatched_exceptions(exceptionspath, pokes):
+    registry = get_exceptions(exceptionspath)
+    unmatched = list(registry["unparsed"])
+    for poke, section in registry["files"]:
+        ndexes = exception_sections.get(section, [])
+        if (
+            poke not in pokes
+            or (ndexes is not None and int(poke) not in ndexes)
+            or (section == "mainMS" and (poke, "main") in registry["files"])
+        ):
+            unmatched.append(f"{poke}_{section}.txt")
+    unmatched.sort()
+    if unmatched:
+        print(f"Exception files not matching any Pokémon: {', '.join(unmatched)}")
+    return unmatched
+
+
+# get texts of all exception files of given Pokémon as {section: text}
+def get_poke_exceptions(exceptionspath, poke):
+    files = get_exceptions(exceptionspath)["files"]
+    return {section: text for (p, section), text in files.items() if p == poke}
+
+
+# Call function with given args, unless cache (a dict) already has a result for
+# given key built from the same inputs, which must contain everything the result
+# depends on (sets are hashed as sorted lists). Console output of function is
+# cached too and printed again. Return result and True if it was read from cache.
+def call_cached(cache, key, inputs, function, *args):
+    inputs = json.dumps([code_hash, inputs], sort_keys=True, default=sorted)
+    inputs_hash = hashlib.sha1(inputs.encode()).hexdigest()
+    entry = cache.get(key)
+    if entry and entry["hash"] == inputs_hash:
+        print(entry["output"], end="")
+        return entry["result"], True
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = function(*args)
+    print(output.getvalue(), end="")
+    cache[key] = {"hash": inputs_hash, "result": result, "output": output.getvalue()}
+    return result, False
+
+
 # From lst get all entries that start with ndex with or without form abbr; then
 # insert these abbrs in provided dictionary as keys with specified value. For example,
 # if lst is ["215", "215H", "229"] and ndex in "215" the dictionary is updated
@@ -169,7 +364,7 @@ def get_poke_forms(poke, availforms):
     return poke_forms
 
 
-# check if list of artworks contain given artwork trying with all possible extensions
+# check if artworks contain given artwork trying with all possible extensions
 def check_art(arts, art_noext, exts):
     match = None
     for ext in exts:
@@ -198,11 +393,11 @@ def insert_arts(pokeabbr, arts, shiny, artsources):
             if ext:
                 # parameter of template pokemonimages/artworks
                 sourceabbr = artsources[source]["abbr"]
-                # add found artwork to page and remove it from list of artworks
+                # add found artwork to page and remove it from artworks
                 # this is needed to retrieve artworks with non-standard name
                 # they will be added separately and have to be handled manually
                 art = f"{art_base}.{ext}"
-                arts.remove(art)
+                del arts[art]
                 # count number of artworks of given form from this source
                 counter = 1
                 while True:
@@ -210,7 +405,7 @@ def insert_arts(pokeabbr, arts, shiny, artsources):
                     ext = check_art(arts, art_noext, exts)
                     if ext:
                         art = f"{art_noext}.{ext}"
-                        arts.remove(art)
+                        del arts[art]
                         counter += 1
                     else:
                         break
@@ -222,7 +417,7 @@ def insert_arts(pokeabbr, arts, shiny, artsources):
 # if previous function returns non-empty text, return pokemonimages/artworks
 # otherwise nothing is done and empty text is returned
 def build_form_arts(pokeabbr, form, arts, artsources):
-    shinies = (len([art for art in arts if f"Artwork{pokeabbr} cromatico" in art]) > 0)
+    shinies = any(f"Artwork{pokeabbr} cromatico" in art for art in arts)
     newtext, arts = insert_arts(pokeabbr, arts, False, artsources)
     if newtext:
         text = f"{{{{pokemonimages/artworks\n|ndex={pokeabbr}\n"
@@ -247,11 +442,12 @@ def build_form_arts(pokeabbr, form, arts, artsources):
 # build entire content of artworks box for given Pokémon
 def build_arts(poke, arts, abbrs, gender, artsources, extras, pagetext=""):
     ndex = int(poke)
-    # remove unneded arts
-    arts = [art for art in arts if " tutte le forme" not in art]
+    # remove unneded arts; a dict is used as ordered set, so that artworks can be
+    # found and removed in O(1) while keeping order of those not removed
+    arts = dict.fromkeys(art for art in arts if " tutte le forme" not in art)
     if ndex in [25, 133]:
-        arts.remove(f"Artwork{poke}m PMDDX.png")
-        arts.remove(f"Artwork{poke}f PMDDX.png")
+        del arts[f"Artwork{poke}m PMDDX.png"]
+        del arts[f"Artwork{poke}f PMDDX.png"]
     # no alternative forms
     if len(abbrs) == 1:
         text, arts = build_form_arts(poke, False, arts, artsources)
@@ -309,7 +505,7 @@ def check_pokeform_game_availability(poke, form, game, availpokes, availforms):
 
 # get all games in given generation where given form is available
 def get_pokeform_gen_games(poke, form, gen, availpokes, availforms):
-    gen_games = [game for game in game_to_gen if int(game_to_gen[game]) == int(gen)]
+    gen_games = gen_to_games.get(int(gen), [])
     return [game for game in gen_games if check_pokeform_game_availability(poke, form, game, availpokes, availforms)]  # fmt: skip
 
 
@@ -547,10 +743,9 @@ def merge_duplicate_ms(main_text, poke, abbrs):
 def build_main(poke, exceptionspath, forms, gender, singleMS, availpokes, availforms, imgs):  # fmt: skip
     text = ""
     # check for exception
-    exceptionfile = os.path.join(exceptionspath, f"{poke}_main.txt")
-    if os.path.isfile(exceptionfile):
-        with open(exceptionfile, "r") as file:
-            text += file.read()
+    exceptiontext = get_exception(exceptionspath, poke, "main")
+    if exceptiontext is not None:
+        text += exceptiontext
     else:
         ndex = int(poke)
         if ndex <= 151:
@@ -560,10 +755,9 @@ def build_main(poke, exceptionspath, forms, gender, singleMS, availpokes, availf
         if ndex <= 385:
             text += build_main_gen(poke, "3", availpokes=availpokes, availforms=availforms, forms=forms)  # fmt: skip
         if ndex == 386:
-            with open(os.path.join(exceptionspath, f"{poke}_main3.txt"), "r") as file:
-                text += file.read().strip()
+            text += get_exception(exceptionspath, poke, "main3", required=True).strip()
         if ndex <= 493:
-            gen4sprites = [img for img in imgs if re.search(r"^Spr(dp|pt|hgss)", img)]
+            gen4sprites = {img for img in imgs if re.search(r"^Spr(dp|pt|hgss)", img)}
             text += build_main_gen(poke, "4", availpokes=availpokes, availforms=availforms, forms=forms, gender=gender, gen4sprites=gen4sprites)  # fmt: skip
         if ndex <= 649:
             text += build_main_gen(poke, "5", availpokes=availpokes, availforms=availforms, forms=forms, gender=gender)  # fmt: skip
@@ -576,10 +770,9 @@ def build_main(poke, exceptionspath, forms, gender, singleMS, availpokes, availf
         # mini sprites
         text += "{{pokemonimages/group|gen=MS|content=\n"
         # check for exception
-        exceptionfile = os.path.join(exceptionspath, f"{poke}_mainMS.txt")
-        if os.path.isfile(exceptionfile):
-            with open(exceptionfile, "r") as file:
-                text += file.read()
+        exceptiontext = get_exception(exceptionspath, poke, "mainMS")
+        if exceptiontext is not None:
+            text += exceptiontext
         else:
             if singleMS:
                 text += build_ms_entry(poke, forms[0], False, availpokes, availforms, gender)  # fmt: skip
@@ -626,14 +819,17 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
     texts = []
     finaltext = ""
     uselessgender = abbrs[:2] == ["", "F"] and gender[""] == "both"
+    # images are mostly looked up by exact name, a set makes it O(1)
+    imgset = set(imgs)
+    duelimgs = [img for img in imgs if "Duel" in img]
     for abbr in abbrs:
         pokeabbr = poke + abbr
         ndexabbr = f"{ndex}{abbr}"
         formtext = ""
         # Stadium
-        if f"Sprstad{pokeabbr}.png" in imgs:
+        if f"Sprstad{pokeabbr}.png" in imgset:
             formtext += "|stadium=StS2\n"
-        elif f"Sprstad2{pokeabbr}.png" in imgs:
+        elif f"Sprstad2{pokeabbr}.png" in imgset:
             formtext += "|stadium=S2\n"
         if abbr == "":
             # TCG
@@ -664,74 +860,74 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
                             formtext += "|extratcg2name={}\n".format(re.sub(extrasearch, r"\2", item))  # fmt: skip
             # Pinball
             pinball = ""
-            if f"Pin{pokeabbr}.png" in imgs:
+            if f"Pin{pokeabbr}.png" in imgset:
                 pinball += "rb"
-            if f"PinRZ{pokeabbr}.png" in imgs:
+            if f"PinRZ{pokeabbr}.png" in imgset:
                 pinball += "rz"
-            if f"Pinani{pokeabbr}.gif" in imgs or f"PinRZani{pokeabbr}.gif" in imgs:
+            if f"Pinani{pokeabbr}.gif" in imgset or f"PinRZani{pokeabbr}.gif" in imgset:
                 pinball += "double"
             else:
                 pinball += "single"
             if pinball.replace("single", ""):
                 formtext += f"|pinball={pinball}\n"
             # Puzzle Challenge
-            if f"PuzzleChallenge{pokeabbr}.png" in imgs:
+            if f"PuzzleChallenge{pokeabbr}.png" in imgset:
                 formtext += "|puzzlechallenge=yes\n"
         # Auros
-        if f"Sprcolo{pokeabbr}.png" in imgs:
+        if f"Sprcolo{pokeabbr}.png" in imgset:
             formtext += "|auros=coloxd\n"
-        elif f"Sprxdsh{pokeabbr}.png" in imgs:
+        elif f"Sprxdsh{pokeabbr}.png" in imgset:
             formtext += "|auros=xd\n"
-        elif f"Sprxd{pokeabbr}.png" in imgs:
+        elif f"Sprxd{pokeabbr}.png" in imgset:
             formtext += "|auros=xdsingle\n"
         # Dash
-        if f"Dash{pokeabbr}.png" in imgs:
+        if f"Dash{pokeabbr}.png" in imgset:
             formtext += "|dash=yes\n"
         # Link
-        if f"Linkani{pokeabbr}.gif" in imgs and f"LB{pokeabbr}.png" in imgs:
+        if f"Linkani{pokeabbr}.gif" in imgset and f"LB{pokeabbr}.png" in imgset:
             formtext += "|link=both\n"
-        elif f"Linkani{pokeabbr}.gif" in imgs:
+        elif f"Linkani{pokeabbr}.gif" in imgset:
             formtext += "|link=link\n"
-        elif f"LB{pokeabbr}.png" in imgs:
+        elif f"LB{pokeabbr}.png" in imgset:
             formtext += "|link=battle\n"
         # Team Turbo
-        if f"TeamTurbo{pokeabbr}.png" in imgs:
+        if f"TeamTurbo{pokeabbr}.png" in imgset:
             formtext += "|teamturbo=yes\n"
         # Mystery Dungeon
-        if f"MDSprrb{pokeabbr}.png" in imgs:
+        if f"MDSprrb{pokeabbr}.png" in imgset:
             formtext += "|mdrbtoc=rbtoc\n"
-        elif f"MDSprtoc{pokeabbr}.png" in imgs:
+        elif f"MDSprtoc{pokeabbr}.png" in imgset:
             if ndexabbr in ["487O", "492", "492C"]:  # other hardcoded ndexes
                 formtext += "|mdrbtoc=c\n"
             else:
                 formtext += "|mdrbtoc=toc\n"
-        if f"MDPPSI{pokeabbr}.png" in imgs:
+        if f"MDPPSI{pokeabbr}.png" in imgset:
             formtext += "|mdpsi=yes\n"
-        if f"MDPSuper{pokeabbr} sh.png" in imgs:
+        if f"MDPSuper{pokeabbr} sh.png" in imgset:
             formtext += "|mdsuper=shiny\n"
-        elif f"MDPSuper{pokeabbr} f.png" in imgs:
+        elif f"MDPSuper{pokeabbr} f.png" in imgset:
             formtext += "|mdsuper=both\n"
-        elif f"MDPSuper{pokeabbr}.png" in imgs:
+        elif f"MDPSuper{pokeabbr}.png" in imgset:
             formtext += "|mdsuper=normal\n"
         mddx = ""
-        if f"MDPDX{pokeabbr}.png" in imgs:
+        if f"MDPDX{pokeabbr}.png" in imgset:
             mddx += "mn"
-        if f"MDPDX{pokeabbr} f.png" in imgs:
+        if f"MDPDX{pokeabbr} f.png" in imgset:
             mddx += "fn"
-        if f"MDPDXsh{pokeabbr}.png" in imgs:
+        if f"MDPDXsh{pokeabbr}.png" in imgset:
             mddx += "msh"
-        if f"MDPDXsh{pokeabbr} f.png" in imgs:
+        if f"MDPDXsh{pokeabbr} f.png" in imgset:
             mddx += "fsh"
         if mddx:
             formtext += f"|mddx={mddx}\n"
         mddxmini = ""
-        if f"MDSprdx{pokeabbr}.png" in imgs:
+        if f"MDSprdx{pokeabbr}.png" in imgset:
             mddxmini += "mn"
-        if f"MDSprdx{pokeabbr} f.png" in imgs:
+        if f"MDSprdx{pokeabbr} f.png" in imgset:
             mddxmini += "fn"
-        if f"MDSprdx{pokeabbr} sh.png" in imgs:
+        if f"MDSprdx{pokeabbr} sh.png" in imgset:
             mddxmini += "msh"
-        if f"MDSprdx{pokeabbr} f sh.png" in imgs:
+        if f"MDSprdx{pokeabbr} f sh.png" in imgset:
             mddxmini += "fsh"
         if mddxmini:
             formtext += f"|mddxmini={mddxmini}\n"
@@ -739,77 +935,77 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
         ranger1 = f"Sprranger{pokeabbr}.png"
         ranger2 = f"Sprrangerosa{pokeabbr}.png"
         ranger3 = f"Sprrangertdl{pokeabbr}.png"
-        if ranger1 in imgs:
+        if ranger1 in imgset:
             ranger = "ranger1"
             if f"{ranger2} > {ranger1}" in rangerdata:
                 ranger += "2"
             if f"{ranger3} > {ranger1}" in rangerdata:
                 ranger += "3"
             formtext += f"|{ranger}=yes\n"
-        if ranger2 in imgs:
+        if ranger2 in imgset:
             ranger = "ranger2"
             if f"{ranger3} > {ranger2}" in rangerdata:
                 ranger += "3"
             formtext += f"|{ranger}=yes\n"
-        if ranger3 in imgs:
+        if ranger3 in imgset:
             formtext += "|ranger3=yes\n"
         if re.search(r"(\|ranger\d\d=yes\n\|ranger\d=yes|\|ranger\d=yes\n\|ranger\d\d=yes)", formtext):  # fmt: skip
             print(f"Check Ranger: {pokeabbr}")
         # Battle Revolution
-        if f"PBR{pokeabbr}.png" in imgs:
+        if f"PBR{pokeabbr}.png" in imgset:
             formtext += "|pbr=single\n"
-        elif f"PBR{pokeabbr}m.png" in imgs and f"PBR{pokeabbr}f.png" in imgs:
+        elif f"PBR{pokeabbr}m.png" in imgset and f"PBR{pokeabbr}f.png" in imgset:
             formtext += "|pbr=both\n"
         # Rumble
         rumble = ""
-        if f"SPR{pokeabbr}.png" in imgs:
+        if f"SPR{pokeabbr}.png" in imgset:
             rumble += "2"
-        if f"PRW{pokeabbr}.png" in imgs:
+        if f"PRW{pokeabbr}.png" in imgset:
             rumble += "4"
-        if f"Rush{pokeabbr} f.png" in imgs:
+        if f"Rush{pokeabbr} f.png" in imgset:
             rumble += "5g"
-        elif f"Rush{pokeabbr}.png" in imgs:
+        elif f"Rush{pokeabbr}.png" in imgset:
             rumble += "5"
         if rumble:
             formtext += f"|rumble={rumble}\n"
         # PokéPark
-        if f"PPWM{pokeabbr}.png" in imgs:
+        if f"PPWM{pokeabbr}.png" in imgset:
             formtext += "|pokepark=both\n"
-        elif f"PPW{pokeabbr}.png" in imgs or f"PP2{pokeabbr}.png" in imgs:
+        elif f"PPW{pokeabbr}.png" in imgset or f"PP2{pokeabbr}.png" in imgset:
             formtext += "|pokepark=sprite\n"
         # Dream World
-        if f"PDW{pokeabbr}.png" in imgs:
+        if f"PDW{pokeabbr}.png" in imgset:
             formtext += "|pdw=yes\n"
         # Impara con Pokémon
-        if f"ICP{pokeabbr}.png" in imgs:
+        if f"ICP{pokeabbr}.png" in imgset:
             formtext += "|icp=yes\n"
         # Conquest
-        if f"PCP{pokeabbr}.png" in imgs:
+        if f"PCP{pokeabbr}.png" in imgset:
             formtext += "|cq=yes\n"
         # Pokédex 3D Pro
-        if f"P3P{pokeabbr}.png" in imgs:
+        if f"P3P{pokeabbr}.png" in imgset:
             formtext += "|p3p=yes\n"
         # Shuffle
-        if f"Shuffle{pokeabbr}.png" in imgs:
+        if f"Shuffle{pokeabbr}.png" in imgset:
             formtext += "|shuffle=yes\n"
-            if f"Shuffle{pokeabbr}cr.png" in imgs:
+            if f"Shuffle{pokeabbr}cr.png" in imgset:
                 formtext += "|shufflecr=yes\n"
-            if f"Shuffle{pokeabbr}oc.png" in imgs:
+            if f"Shuffle{pokeabbr}oc.png" in imgset:
                 formtext += "|shuffleoc=yes\n"
-            if f"Shuffle{pokeabbr}im.png" in imgs:
+            if f"Shuffle{pokeabbr}im.png" in imgset:
                 formtext += "|shuffleim=yes\n"
-            if f"Shuffle{pokeabbr}fe.png" in imgs:
+            if f"Shuffle{pokeabbr}fe.png" in imgset:
                 formtext += "|shufflefe=yes\n"
-            if f"Shuffle{pokeabbr}boss.png" in imgs:
+            if f"Shuffle{pokeabbr}boss.png" in imgset:
                 formtext += "|shuffleboss=yes\n"
         # Super Mario maker
-        if f"SMM{pokeabbr}.png" in imgs:
+        if f"SMM{pokeabbr}.png" in imgset:
             formtext += "|smm=yes\n"
         # Picross
-        if f"Picross{pokeabbr}.png" in imgs:
+        if f"Picross{pokeabbr}.png" in imgset:
             formtext += "|picross=yes\n"
         # Duel
-        duel = [img for img in imgs if re.search(r"Duel(sh)?{}\b".format(pokeabbr), img)]  # fmt: skip
+        duel = [img for img in duelimgs if re.search(r"Duel(sh)?{}\b".format(pokeabbr), img)]  # fmt: skip
         if duel:
             counter = 1
             for img in duel:
@@ -824,38 +1020,38 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
                 value = re.sub(pattern, r"\1", img)
                 formtext += f"|{param}={value}\n"
         # GO
-        if f"GO{pokeabbr} f s.png" in imgs:
+        if f"GO{pokeabbr} f s.png" in imgset:
             formtext += "|go=shinyboth\n"
-        elif f"GO{pokeabbr} s.png" in imgs:
+        elif f"GO{pokeabbr} s.png" in imgset:
             formtext += "|go=shiny\n"
-        elif f"GO{pokeabbr} f.png" in imgs:
+        elif f"GO{pokeabbr} f.png" in imgset:
             formtext += "|go=both\n"
-        elif f"GO{pokeabbr}.png" in imgs:
+        elif f"GO{pokeabbr}.png" in imgset:
             formtext += "|go=normal\n"
         # Magikarp Jump
-        if f"MJ{pokeabbr}.png" in imgs:
+        if f"MJ{pokeabbr}.png" in imgset:
             formtext += "|mj=yes\n"
         # Casetta dei Pokémon
-        if f"CDP{pokeabbr}.png" in imgs:
+        if f"CDP{pokeabbr}.png" in imgset:
             formtext += "|cdp=yes\n"
         # Detective Pikachu
-        if f"DetectivePikachu{pokeabbr}.png" in imgs:
+        if f"DetectivePikachu{pokeabbr}.png" in imgset:
             formtext += "|dp=yes\n"
         # Quest
-        if f"QuestSpr{pokeabbr}.png" in imgs:
+        if f"QuestSpr{pokeabbr}.png" in imgset:
             formtext += "|quest=yes\n"
         # Masters
-        if f"MastersEX{pokeabbr}f.png" in imgs:
+        if f"MastersEX{pokeabbr}f.png" in imgset:
             formtext += "|mastersnormal=both\n"
-        elif f"MastersEX{pokeabbr}.png" in imgs:
+        elif f"MastersEX{pokeabbr}.png" in imgset:
             formtext += "|mastersnormal=single\n"
-        if f"MastersEXsh{pokeabbr}f.png" in imgs:
+        if f"MastersEXsh{pokeabbr}f.png" in imgset:
             formtext += "|mastersshiny=both\n"
-        elif f"MastersEXsh{pokeabbr}.png" in imgs:
+        elif f"MastersEXsh{pokeabbr}.png" in imgset:
             formtext += "|mastersshiny=single\n"
-        if f"MastersIcona{pokeabbr} f.png" in imgs:
+        if f"MastersIcona{pokeabbr} f.png" in imgset:
             formtext += "|mastersmugshot=both\n"
-        elif f"MastersIcona{pokeabbr}.png" in imgs:
+        elif f"MastersIcona{pokeabbr}.png" in imgset:
             formtext += "|mastersmugshot=single\n"
         # HOME
         # single:               Homem
@@ -873,52 +1069,52 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
         # gender differences treated as useless forms need some fixes
         if uselessgender and abbr in ["", "F"]:
             if abbr == "":
-                if f"Homemsh{poke}.png" in imgs:
+                if f"Homemsh{poke}.png" in imgset:
                     formtext += "|home=shiny\n"
-                elif f"Homem{poke}.png" in imgs:
+                elif f"Homem{poke}.png" in imgset:
                     formtext += "|home=single\n"
             else:
-                if f"Homemsh{poke}.png" in imgs:
+                if f"Homemsh{poke}.png" in imgset:
                     formtext += "|home=shiny-f\n"
-                elif f"Homem{poke}.png" in imgs:
+                elif f"Homem{poke}.png" in imgset:
                     formtext += "|home=single-f\n"
         else:
-            if f"Homemdsh{pokeabbr}.png" in imgs and f"Homefdsh{pokeabbr}.png" in imgs:
+            if f"Homemdsh{pokeabbr}.png" in imgset and f"Homefdsh{pokeabbr}.png" in imgset:  # fmt: skip
                 formtext += "|home=all\n"
-            elif f"Homefd{pokeabbr}.png" in imgs and f"Homefdsh{pokeabbr}.png" in imgs:
+            elif f"Homefd{pokeabbr}.png" in imgset and f"Homefdsh{pokeabbr}.png" in imgset:  # fmt: skip
                 formtext += "|home=shinyback-f\n"
-            elif f"Homemd{pokeabbr}.png" in imgs and f"Homemdsh{pokeabbr}.png" in imgs:
+            elif f"Homemd{pokeabbr}.png" in imgset and f"Homemdsh{pokeabbr}.png" in imgset:  # fmt: skip
                 formtext += "|home=shinyback\n"
-            elif f"Homemd{pokeabbr}.png" in imgs and f"Homefd{pokeabbr}.png" in imgs:
+            elif f"Homemd{pokeabbr}.png" in imgset and f"Homefd{pokeabbr}.png" in imgset:  # fmt: skip
                 formtext += "|home=genderback\n"
-            elif f"Homemsh{pokeabbr}.png" in imgs and f"Homefsh{pokeabbr}.png" in imgs:
+            elif f"Homemsh{pokeabbr}.png" in imgset and f"Homefsh{pokeabbr}.png" in imgset:  # fmt: skip
                 formtext += "|home=gendershiny\n"
-            elif f"Homefd{pokeabbr}.png" in imgs:
+            elif f"Homefd{pokeabbr}.png" in imgset:
                 formtext += "|home=back-f\n"
-            elif f"Homemd{pokeabbr}.png" in imgs:
+            elif f"Homemd{pokeabbr}.png" in imgset:
                 formtext += "|home=back\n"
-            elif f"Homefsh{pokeabbr}.png" in imgs:
+            elif f"Homefsh{pokeabbr}.png" in imgset:
                 formtext += "|home=shiny-f\n"
-            elif f"Homemsh{pokeabbr}.png" in imgs:
+            elif f"Homemsh{pokeabbr}.png" in imgset:
                 formtext += "|home=shiny\n"
-            elif f"Homem{pokeabbr}.png" in imgs and f"Homef{pokeabbr}.png" in imgs:
+            elif f"Homem{pokeabbr}.png" in imgset and f"Homef{pokeabbr}.png" in imgset:
                 formtext += "|home=gender\n"
-            elif f"Homef{pokeabbr}.png" in imgs:
+            elif f"Homef{pokeabbr}.png" in imgset:
                 formtext += "|home=single-f\n"
-            elif f"Homem{pokeabbr}.png" in imgs:
+            elif f"Homem{pokeabbr}.png" in imgset:
                 formtext += "|home=single\n"
         # Smile
-        if f"Smile{pokeabbr}.png" in imgs:
+        if f"Smile{pokeabbr}.png" in imgset:
             formtext += "|smile=yes\n"
-        if f"SmileCostume{pokeabbr} 4.png" in imgs:
+        if f"SmileCostume{pokeabbr} 4.png" in imgset:
             formtext += "|smilecostume=4\n"
-        elif f"SmileCostume{pokeabbr} 2.png" in imgs:
+        elif f"SmileCostume{pokeabbr} 2.png" in imgset:
             formtext += "|smilecostume=2\n"
-        if f"SmileIcona{pokeabbr}.png" in imgs:
+        if f"SmileIcona{pokeabbr}.png" in imgset:
             formtext += "|smileicona=yes\n"
-        if f"SmileDormiente{pokeabbr}.png" in imgs:
+        if f"SmileDormiente{pokeabbr}.png" in imgset:
             formtext += "|smiledormiente=yes\n"
-        if f"SmileConsiglio{pokeabbr}.png" in imgs:
+        if f"SmileConsiglio{pokeabbr}.png" in imgset:
             formtext += "|smileconsiglio=yes\n"
         if ndexabbr in ["7", "25", "133"]:
             extra = [img for img in imgs if re.search(r"Smile(.*){}".format(name), img)]
@@ -928,16 +1124,16 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
                 formtext += "|smileextra{}={}\n".format(str(counter).replace("1", ""), re.sub(r"SmileCostume (.+)\.png", r"\1", img))  # fmt: skip
         # Café ReMix
         cafemix = ""
-        if f"CafeMixSprite{pokeabbr} staff.png" in imgs:
+        if f"CafeMixSprite{pokeabbr} staff.png" in imgset:
             cafemix += "s"
-        if f"CafeMixSprite{pokeabbr} guest.png" in imgs:
+        if f"CafeMixSprite{pokeabbr} guest.png" in imgset:
             cafemix += "g"
-        if f"CafeMixSprite{pokeabbr} tassello.png" in imgs:
+        if f"CafeMixSprite{pokeabbr} tassello.png" in imgset:
             cafemix += "t"
         if cafemix:
             formtext += f"|cafemix={cafemix}\n"
         # New Pokémon Snap
-        if f"NPS{pokeabbr}.png" in imgs:
+        if f"NPS{pokeabbr}.png" in imgset:
             formtext += "|newsnap=yes\n"
         # add only if there are entries for this form
         if formtext:
@@ -955,27 +1151,23 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
         )
     # extras for specific Pokémon (Pikachu, Magikarp, Lugia)
     if ndex == 25:
-        with open(os.path.join(exceptionspath, f"{poke}_extraTCG.txt"), "r") as file:  # fmt: skip
-            finaltext += file.read()
-        with open(os.path.join(exceptionspath, f"{poke}_extraShuffle.txt"), "r") as file:  # fmt: skip
-            finaltext += file.read()
+        finaltext += get_exception(exceptionspath, poke, "extraTCG", required=True)
+        finaltext += get_exception(exceptionspath, poke, "extraShuffle", required=True)  # fmt: skip
     elif ndex == 129:
-        with open(os.path.join(exceptionspath, f"{poke}_extraMJ.txt"), "r") as file:  # fmt: skip
-            finaltext += file.read()
+        finaltext += get_exception(exceptionspath, poke, "extraMJ", required=True)
     elif ndex == 249:
-        with open(os.path.join(exceptionspath, f"{poke}_extraXD.txt"), "r") as file:  # fmt: skip
-            finaltext += file.read()
+        finaltext += get_exception(exceptionspath, poke, "extraXD", required=True)
     # GO extras
     extrago = ""
     for goform in goforms:
-        if f"GO{poke} {goform}.png" in imgs:
-            if f"GO{poke} {goform} f.png" in imgs:
-                if f"GO{poke} {goform} s.png" in imgs:
+        if f"GO{poke} {goform}.png" in imgset:
+            if f"GO{poke} {goform} f.png" in imgset:
+                if f"GO{poke} {goform} s.png" in imgset:
                     text = "shinyboth"
                 else:
                     text = "both"
             else:
-                if f"GO{poke} {goform} s.png" in imgs:
+                if f"GO{poke} {goform} s.png" in imgset:
                     text = "shiny"
                 else:
                     text = "normal"
@@ -989,14 +1181,12 @@ def build_spinoffs(poke, name, gender, abbrs, imgs, rangerdata, goforms, excepti
         extras = [re.sub(search, r"\1", img) for img in extramddx]
         finaltext += "{{{{pokemonimages/extraMDDX|ndex={}|{}}}}}\n".format(poke, "|".join(extras))  # fmt: skip
     # Café Mix extras
-    cmfile = os.path.join(exceptionspath, f"{poke}_extraCM.txt")
-    if os.path.isfile(cmfile):
-        with open(cmfile, "r") as file:
-            finaltext += file.read()
+    finaltext += get_exception(exceptionspath, poke, "extraCM") or ""
     return finaltext
 
 
-# build wikicode of page for given Pokémon
+# build wikicode of page for given Pokémon and return it; it's saved to a text file
+# in pagespath, unless pagespath is empty
 def build_poke_page(poke, name, pokelistspath, pagespath, artsources, goforms, exceptionspath, gender, singleMS, availpokes, availforms, rangerdata, enname, esname, dename, frname):  # fmt: skip
     # get alternative forms
     forms = get_poke_forms(poke, availforms)
@@ -1026,5 +1216,56 @@ def build_poke_page(poke, name, pokelistspath, pagespath, artsources, goforms, e
     # pagetext += f'[[es:{esname}/...]]\n'
     pagetext += f"[[fr:{frname}/Imagerie]]\n"
     # write all wikicode to text file
-    with open(f"{os.path.join(pagespath, poke)}.txt", "w") as file:
-        file.write(pagetext)
+    if pagespath:
+        with open(f"{os.path.join(pagespath, poke)}.txt", "w") as file:
+            file.write(pagetext)
+    return pagetext
+
+
+# Task run for each Pokémon by run_for_pokes; it's a global so that forked workers
+# inherit it (together with all data it uses) copy-on-write, instead of receiving
+# it pickled with every task.
+pool_task = None
+
+
+# run pool_task for given Pokémon, capturing its console output and errors
+def run_poke_task(poke):
+    output = io.StringIO()
+    result = error = None
+    with contextlib.redirect_stdout(output):
+        try:
+            result = pool_task(poke)
+        except Exception:
+            error = traceback.format_exc()
+    return poke, output.getvalue(), error, result
+
+
+# Run task (a function with poke as only argument) for all given Pokémon, using
+# jobs forked processes if jobs > 1. Console output of each Pokémon is printed
+# in the same order as pokes, no matter which process finishes first; errors are
+# printed as well without stopping other Pokémon. If given, on_result is called
+# with each Pokémon and value returned by task for it, in the same order and as
+# soon as it is available. Return Pokémon that failed.
+def run_for_pokes(task, pokes, jobs=1, on_result=None):
+    global pool_task
+    pool_task = task
+    failed = []
+    if jobs > 1:
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+        pokes_results = pool.imap(run_poke_task, pokes)
+    else:
+        pool = None
+        pokes_results = map(run_poke_task, pokes)
+    for poke, output, error, result in pokes_results:
+        print(output, end="")
+        if error:
+            print(f"Error processing #{poke}:\n{error}")
+            failed.append(poke)
+        elif on_result:
+            on_result(poke, result)
+    if pool:
+        pool.close()
+        pool.join()
+    if failed:
+        print(f"Failed Pokémon: {', '.join(failed)}")
+    return failed
@@ -1,4 +1,4 @@
-import pywikibot, argparse, re, os, os.path, sys, subprocess, json, importlib
+import pywikibot, argparse, re, os, os.path, sys, json, importlib
 from pywikibot import pagegenerators
 
 """
@@ -11,6 +11,11 @@ in a directory or to update an entire category on Pokémon Central Wiki. Argumen
 --artsourcesfile: path of file with sources data (already populated).
 --test: "no" to perform actual modifications/uploads on website, otherwise only
 a preview will be printed.
+--workers: number of images uploaded at the same time (default 4).
+--chunksize: images larger than this size in bytes are uploaded in chunks (default 5 MiB).
+--plan: "yes" to compare images in directory with those in wiki (by SHA-1) and only
+print which ones are new, changed or identical, without uploading anything; when
+uploading, identical images are always skipped.
 
 Artwork names for single Pokémon are built as follows:
 - "Artwork" prefix.
@@ -47,7 +52,33 @@ sys.modules["utils"] = utils
 spec.loader.exec_module(utils)
 
 
-def build_template(file_name, artsources, ndex_to_gen, credits=""):
+# build a trie of artwork sources read backwards, each one preceded by a space: this
+# way the longest source at the end of a file name can be found with a single scan
+def build_artsources_trie(artsources):
+    trie = {}
+    for entry in artsources:
+        node = trie
+        for char in reversed(f" {entry}"):
+            node = node.setdefault(char, {})
+        node[None] = entry
+    return trie
+
+
+# find the longest artwork source at the end of given file name, scanning it backwards
+# along the trie; longest match avoids problems with sources such as "promo HOME SV"
+# that would be classified as "SV" otherwise
+def find_artsource(file_name, artsources_trie):
+    source = None
+    node = artsources_trie
+    for char in reversed(file_name):
+        node = node.get(char)
+        if node is None:
+            break
+        source = node.get(None, source)
+    return source
+
+
+def build_template(file_name, artsources, artsources_trie, ndex_to_gen, credits=""):
     # initialize some variables used in this function
     template = None
     source = None
@@ -57,18 +88,13 @@ def build_template(file_name, artsources, ndex_to_gen, credits=""):
     # remove extension and, if present, final number
     file_name = re.sub(r"\.\w+$", r"", file_name)
     file_name = re.sub(r" \d{1,2}$", r"", file_name)
-    # find artwork source; they are sorted from longest to shortest to avoid
-    # problems with sources such as "promo HOME SV" that would be classified as
-    # "SV" without sorting
-    for entry in sorted(artsources, key=len, reverse=True):
-        if file_name.endswith(f" {entry}"):
-            source = entry
-            source_param = artsources[entry]["pokeartwork_param"]
-            source_cat = artsources[entry]["cat"]
-            break
+    # find artwork source
+    source = find_artsource(file_name, artsources_trie)
     if source:
+        source_param = artsources[source]["pokeartwork_param"]
+        source_cat = artsources[source]["cat"]
         # remove source
-        file_name = re.sub(f" {source}$", r"", file_name)
+        file_name = file_name[: -len(source) - 1]
         # check if shiny
         if file_name.endswith(" cromatico"):
             shiny = "yes"
@@ -138,7 +164,7 @@ def process_wiki_file(file_page, credits, test_mode=True, overwrite_credits=True
                 existing_credits = existing_credits.replace("{{Credits|", "{{credits|")
                 credits = existing_credits
     # try to build template
-    template = build_template(img, artsources, ndex_to_gen, credits)
+    template = build_template(img, artsources, artsources_trie, ndex_to_gen, credits)
     # check if template was built correctly
     if not template:
         print(f"Failed to build template: {img}")
@@ -164,6 +190,9 @@ if __name__ == "__main__":
     parser.add_argument("--credits", default="")
     parser.add_argument("--artsourcesfile", default="data/pokepages-utils/artsources.json")  # fmt: skip
     parser.add_argument("--test", default="yes")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunksize", type=int, default=5 * 1024 * 1024)
+    parser.add_argument("--plan", default="no")
     args = parser.parse_args()
     # check arguments
     if args.dir and not os.path.isdir(args.dir):
@@ -172,42 +201,49 @@ if __name__ == "__main__":
     # get sources data
     with open(args.artsourcesfile, "r") as file:
         artsources = json.load(file)
+    artsources_trie = build_artsources_trie(artsources)
     ndex_to_gen = utils.get_ndex_gen_dict()
     # if a directory is specified, upload all images inside it
     if args.dir:
+        files = []
         for img in sorted(os.listdir(args.dir)):
-            template = build_template(img, artsources, ndex_to_gen, args.credits)
+            template = build_template(img, artsources, artsources_trie, ndex_to_gen, args.credits)  # fmt: skip
             if not template:
                 print(f"Cannot build template for file, skipping upload: {img}")
                 continue
             if test_mode:
                 print(f"{img}   >   {template}")
-            else:
-                page = pywikibot.Page(site, f"File:{img}")
-                if page.exists():
-                    if page.text.startswith("#RINVIA") or page.text.startswith("#REDIRECT"):  # fmt: skip
+            files.append((os.path.join(args.dir, img), img, template))
+        # print upload plan, or upload images that are not identical to those in wiki
+        if args.plan.lower().strip() == "yes":
+            utils.print_upload_plan(utils.plan_uploads(site, files, args.workers))
+        elif not test_mode:
+            plan = utils.plan_uploads(site, files, args.workers)
+            print(f"Skipping {len(plan['identical'])} images identical to those in wiki")  # fmt: skip
+            identical = {name for _, name, _ in plan["identical"]}
+            files = [file for file in files if file[1] not in identical]
+            # check existing pages with batched queries
+            pages_info = utils.get_pages_info(site, [f"File:{img}" for _, img, _ in files])  # fmt: skip
+            uploads = []
+            for path, img, template in files:
+                page_info = pages_info[f"File:{img}"]
+                if page_info["exists"]:
+                    if page_info["redirect"]:
+                        page = pywikibot.Page(site, f"File:{img}")
                         page.delete("Bot: deleting redirect to upload actual image")
                     else:
                         print(f"Skipping {img} since it already exists and is not a redirect")  # fmt: skip
                         continue
-                # os.system(f'python3 pwb.py upload -keep -noverify -ignorewarn -abortonwarn:exists "{os.path.join(args.dir, img)}" "{template}"')  # fmt: skip
-                subprocess.run(
-                    [
-                        "python3",
-                        "pwb.py",
-                        "upload",
-                        "-keep",
-                        "-noverify",
-                        "-ignorewarn",
-                        "-abortonwarn:exists",
-                        f"{os.path.join(args.dir, img)}",
-                        f"{template}",
-                    ]
-                )
+                uploads.append((path, img, template))
+            # upload all images with a single session
+            if uploads:
+                utils.upload_files(site, uploads, args.workers, args.chunksize)
     # if a category is specified, process images in it (recursively)
     elif args.cat:
         cat = pywikibot.Category(site, f"Categoria:{args.cat}")
-        for page in pagegenerators.CategorizedPageGenerator(cat, recurse=True):
+        pages = pagegenerators.CategorizedPageGenerator(cat, recurse=True)
+        # load pages text in batches instead of one by one
+        for page in pagegenerators.PreloadingGenerator(pages):
             process_wiki_file(page, args.credits, test_mode)
     # if a local file is specified, read titles from it and process them on wiki
     elif args.file:
@@ -215,6 +251,7 @@ if __name__ == "__main__":
             sys.exit(f"Cannot find specified file: {args.file}")
         with open(args.file, "r") as file:
             titles = [t for t in file.read().splitlines() if t]
-        for title in titles:
-            page = pywikibot.Page(site, f"File:{title}")
+        pages = [pywikibot.Page(site, f"File:{title}") for title in titles]
+        # load pages text in batches instead of one by one
+        for page in pagegenerators.PreloadingGenerator(pages):
             process_wiki_file(page, args.credits, test_mode)
@@ -1,4 +1,4 @@
-import argparse, sys, os, os.path, json, re
+import argparse, sys, os, os.path, json, re, importlib
 import pywikibot
 
 """
@@ -41,6 +41,15 @@ ndex = 37
 ndexabbr = '37A'
 """
 
+# import utils from 'shared' directory of this repository
+script_path = os.path.realpath(__file__)
+script_dir = os.path.dirname(script_path)
+utils_dir = os.path.join(os.path.dirname(script_dir), "shared")
+spec = importlib.util.spec_from_file_location("utils", os.path.join(utils_dir, "utils.py"))  # fmt: skip
+utils = importlib.util.module_from_spec(spec)
+sys.modules["utils"] = utils
+spec.loader.exec_module(utils)
+
 
 # fmt: off
 """
@@ -142,22 +151,27 @@ page, without "File:". Examples:
 def create_redirects(redirects, test_mode=True):
     site = pywikibot.Site()
     files_ns = "File:"
+    redirects = [
+        [
+            source if source.startswith(files_ns) else f"{files_ns}{source}",
+            dest if dest.startswith(files_ns) else f"{files_ns}{dest}",
+        ]
+        for source, dest in redirects
+    ]
+    # get existence of destination pages and text of redirects with batched queries
+    if not test_mode:
+        pages_info = utils.get_pages_info(site, [title for redirect in redirects for title in redirect])  # fmt: skip
     for source, dest in redirects:
-        if not source.startswith(files_ns):
-            source = f"{files_ns}:{source}"
-        if not dest.startswith(files_ns):
-            dest = f"{files_ns}{dest}"
         wikicode = f"#RINVIA [[{dest}]]"
         if test_mode:
             print(f"{source}      >      {wikicode}")
         else:
             # ensure that destination page exists before creating redirect
-            dest_page = pywikibot.Page(site, dest)
-            if not dest_page.exists():
+            if not pages_info[dest]["exists"]:
                 print(f"Skipping because destination page does not exist: {dest}")
             else:
-                page = pywikibot.Page(site, f"{source}")
-                if not page.text.strip() == wikicode.strip():
+                if not pages_info[source]["text"].strip() == wikicode.strip():
+                    page = pywikibot.Page(site, f"{source}")
                     page.text = wikicode
                     page.save("Bot: creating redirects for Pokémon sprites/models")
                 else:
@@ -212,14 +226,15 @@ def main():
         )
     )
     # process
+    redirects = []
     for pokeabbr in pokeabbrs:
         ndex = int(re.sub(r"\D", r"", pokeabbr))
         ndexabbr = pokeabbr.lstrip("0")
         femaleonly = str(ndex) in gender_data["female-only"]
         genderdiffs = ndexabbr in gender_data["gender-diffs"]
         genderform = str(ndex) in gender_data["gender-forms"]
-        redirects = get_needed_redirects(pokeabbr, prefixes, femaleonly, genderdiffs, genderform, sides, colors)  # fmt: skip
-        create_redirects(redirects, test_mode)
+        redirects += get_needed_redirects(pokeabbr, prefixes, femaleonly, genderdiffs, genderform, sides, colors)  # fmt: skip
+    create_redirects(redirects, test_mode)
 
 
 # invoke main function
@@ -1,4 +1,4 @@
-import pywikibot, argparse, re, os, os.path, sys, subprocess
+import pywikibot, argparse, re, os, os.path, sys, importlib
 from pywikibot import pagegenerators
 
 """
@@ -16,6 +16,11 @@ specify abbreviation of game (is lowercase and may be differ from Modulo:Sigle/d
 --credits: credits for images (wikicode, optional).
 --test: "no" to perform actual modifications/uploads on website, otherwise only
 a preview will be printed.
+--workers: number of images uploaded at the same time (default 4).
+--chunksize: images larger than this size in bytes are uploaded in chunks (default 5 MiB).
+--plan: "yes" to compare images in directory with those in wiki (by SHA-1) and only
+print which ones are new, changed or identical, without uploading anything; when
+uploading, identical images are always skipped.
 
 In all file names mentioned in following comments it holds that:
 - <...> indicates something variable, for example <ndex> is National Pokédex number.
@@ -30,10 +35,19 @@ Supported games:
 - Pokémon Masters EX.
 """
 
+# import utils from 'shared' directory of this repository
+script_path = os.path.realpath(__file__)
+script_dir = os.path.dirname(script_path)
+utils_dir = os.path.join(os.path.dirname(script_dir), "shared")
+spec = importlib.util.spec_from_file_location("utils", os.path.join(utils_dir, "utils.py"))  # fmt: skip
+utils = importlib.util.module_from_spec(spec)
+sys.modules["utils"] = utils
+spec.loader.exec_module(utils)
+
 
 # fmt: off
 """
-Get data for sprites, models and icons in main series games (NOT mini sprites).
+Pattern of sprites, models and icons in main series games (NOT mini sprites).
 File name is "[Spr|Icon]<game>[m|f][d][sh]<ndex>.<ext>", where:
 - [Spr|Icon] is 'Spr' for sprites and models, 'Icon' for mugshots.
 - <game> is abbr of game(s), for example 'nb' is for "Pokémon Nero e Bianco".
@@ -43,33 +57,12 @@ File name is "[Spr|Icon]<game>[m|f][d][sh]<ndex>.<ext>", where:
 - <ndex> is National Pokédex number, including abbr of form if applicable.
 - <ext> is file extension.
 """  # fmt: on
-def get_data_main(img, prefix, gameabbr):
-    ndex = re.sub(prefix + r"\w+[mf]d?(sh)?(\d+(\w+)?)\.\w+", r"\2", img)
-    if re.search(f"^{prefix}{gameabbr}[mf]?d?sh", img):
-        shiny = "yes"
-    else:
-        shiny = "no"
-    if re.search(f"^{prefix}{gameabbr}f", img):
-        female = "yes"
-    else:
-        female = "no"
-    if prefix == "Spr" and not gameabbr.startswith("dex"):
-        if re.search(f"^{prefix}{gameabbr}[mf]?d", img):
-            back = "yes"
-        else:
-            back = "no"
-    else:
-        back = ""
-    if re.search(r"[A-z]", ndex):
-        altform = "yes"
-    else:
-        altform = "no"
-    return ndex, back, shiny, female, altform
+main_pattern = r"(?P<main>{prefix}{gameabbr}(?:m|(?P<main_female>f))?(?P<main_back>d)?(?P<main_shiny>sh)?(?P<main_ndex>\d+\w*)\.\w+)"  # fmt: skip
 
 
 # fmt: off
 """
-Get data for main series mini sprites. File name is
+Pattern of main series mini sprites. File name is
 "[Ani]<ndex>MS<gen|game>[OW*[sh]].<ext>", where:
 - [Ani] is used for animated mini sprites.
 - <ndex> works as above, except generation 1/2 where is name of a Pokémon (many
@@ -87,32 +80,12 @@ Ani0001MS5.gif
 0001MS.png
 0001MSDLPS.png
 """  # fmt: on
-def get_data_ms(img):
-    type = "mini sprite"
-    ndex = re.sub(r"^(Ani)?(.+?)MS.+$", r"\2", img)
-    if re.search(r"^[A-z]", ndex):
-        ndex = "0000"
-    if img.startswith("Ani"):
-        ani = "yes"
-    else:
-        ani = "no"
-    if "MS4OW" in img:
-        if re.search(r"sh\.\w+$", img):
-            shiny = "yes"
-        else:
-            shiny = "no"
-    else:
-        shiny = ""
-    if re.search(r"[A-z]", ndex):
-        altform = "yes"
-    else:
-        altform = "no"
-    return type, ndex, ani, shiny, altform
+ms_pattern = r"(?P<ms>(?P<ms_ani>Ani)?(?P<ms_ndex>.+?)MS(?:(?P<ms_ow>4OW).*?(?P<ms_shiny>sh)?\.\w+|.+))"  # fmt: skip
 
 
 # fmt: off
 """
-Get data for HOME models (both standard and resized). File name is
+Pattern of HOME models (both standard and resized). File name is
 "<Home|Mini>[m|f][d][sh]<ndex>.png", where:
 - <Home|Mini> is for standard and resized models respectively.
 - [m|f] works as above.
@@ -120,164 +93,160 @@ Get data for HOME models (both standard and resized). File name is
 - [sh] works as above.
 - <ndex> works as above.
 """  # fmt: on
-def get_data_home(img):
-    if img.startswith("Home"):
-        type = "modelli"
-        ani = "no"
-        if re.search(r"(Home|Mini)[mf]d", img):
-            back = "yes"
-        else:
-            back = "no"
-    else:
-        type = "modelli scalati"
-        ani = ""
-        back = ""  # resized models are only static and frontal
-    ndex = re.sub(r"^[A-z]+(\d+\w*)([ _]r)?\.\w+", r"\1", img)
-    if "sh" in img:
-        shiny = "yes"
-    else:
-        shiny = "no"
-    if img[4] == "f":
-        female = "yes"
-    else:
-        female = "no"
-    if re.search(r"[A-z]", ndex):
-        altform = "yes"
-    else:
-        altform = "no"
-    return type, ndex, ani, back, shiny, female, altform
+home_pattern = r"(?P<home>(?:Home|(?P<home_mini>Mini))(?:m|(?P<home_female>f))(?P<home_back>d)?(?P<home_shiny>sh)?(?P<home_ndex>\d+\w*)(?:[ _]r)?\.\w+)"  # fmt: skip
 
 
 # fmt: off
 """
-Get data for GO models. File name is "GO<ndex>[ <event>][ f][ s].png", where:
+Pattern of GO models. File name is "GO<ndex>[ <event>][ f][ s].png", where:
 - <ndex> works as above.
 - <event> is special event, for example "FashionWeek21" or "Clone".
 - [ f] is used for female models.
 - [ s] is used for shiny models.
+[ f] and [ s] may also be found in reverse order.
 """  # fmt: on
-def get_data_go(img):
-    type = "modelli"
-    ndex = re.sub(r"^GO(\d+\w*)[ \.].+$", r"\1", img)
-    if re.search(r" s\b", img):
-        shiny = "yes"
-    else:
-        shiny = "no"
-    if re.search(r" f\b", img):
-        female = "yes"
-    else:
-        female = "no"
-    if re.search(r"[A-z]", ndex):
-        altform = "yes"
-    else:
-        altform = "no"
-    if re.search(r"^GO(\d+\w*) \w{2,}", img):
-        event = "yes"
-    else:
-        event = "no"
-    return type, ndex, shiny, female, altform, event
+go_pattern = r"(?P<go>GO(?P<go_ndex>\d+\w*)(?P<go_event>(?: \w{2,})+)?(?P<go_female> f)?(?P<go_shiny> s)?(?P<go_female_last> f)?\.\w+)"  # fmt: skip
 
 
 # fmt: off
 """
-Get data for Sleep sprite/models. File name is "Sleep<type>[sh]<ndex>[-<event>-<form>].png", where:
+Pattern of Sleep sprite/models. File name is "Sleep<type>[sh]<ndex>[-<event>-<form>][ f].png", where:
 - <type> is "Icona" for mugshots and "Sonno" for sleep styles.
 - [sh] is used for shiny sprite/models.
 - <ndex> works as above.
 - <event> and <form> are used for event-exclusive variants, using in-app names formatted
 in Pascal Case: examples are "-Halloween-Arancione" and "-Feste-GhirlandaFestiva".
+- [ f] may be used for female sprite/models, but it isn't a template parameter.
 """  # fmt: on
-def get_data_sleep(img):
-    if img.startswith("SleepIcona"):
-        type = "mugshot"
-    elif img.startswith("SleepSonno"):
-        type = "sprite stili di sonno"
-    ndex = re.sub(r"^[A-z]+(\d+\w*)[ \.\-].+$", r"\1", img)
-    if re.search(r"sh\d{4}", img):
-        shiny = "yes"
-    else:
-        shiny = "no"
-    if re.search(r"[A-z]", ndex):
-        altform = "yes"
-    else:
-        altform = "no"
-    if re.search(r"-\w+-\w+", img):
-        event = "yes"
-    else:
-        event = "no"
-    return type, ndex, shiny, altform, event
+sleep_pattern = r"(?P<sleep>Sleep(?:Icona|(?P<sleep_sonno>Sonno))(?P<sleep_shiny>sh)?(?P<sleep_ndex>\d+\w*)(?P<sleep_event>-\w+-\w+)?(?: f)?\.\w+)"  # fmt: skip
 
 
 # fmt: off
 """
-Get data for Masters sprite/models. File name is "MastersEX[sh]<ndex>[f].png"
+Pattern of Masters sprite/models. File name is "MastersEX[sh]<ndex>[f].png"
 or "MastersIcona[sh]<ndex>[ f].png", where:
 - [sh] is used for shiny sprite/models.
 - [f] and [ f] are used for female sprite/models.
 - <ndex> works as above.
 """  # fmt: on
-def get_data_masters(img):
-    if img.startswith("MastersIcona"):
-        type = "mugshot"
-    elif img.startswith("MastersEX"):
-        type = "modelli"
-    ndex = re.sub(r"^[A-z]+(\d+\w*)[ \.\-].+$", r"\1", img)
-    if re.search(r"sh\d{4}", img):
-        shiny = "yes"
-    else:
-        shiny = "no"
-    if re.search(r"\d{4}f$", ndex) or re.search(r" f\b", img):
-        female = "yes"
-    else:
-        female = "no"
-    if re.search(r"[A-Z][A-z]?", ndex):
-        altform = "yes"
-    else:
-        altform = "no"
-    return type, ndex, shiny, female, altform
+masters_pattern = r"(?P<masters>Masters(?:Icona|(?P<masters_ex>EX))(?P<masters_shiny>sh)?(?P<masters_ndex>\d+\w*?(?P<masters_ndex_female>(?<=\d{4})f)?)(?P<masters_female> f)?\.\w+)"  # fmt: skip
 
+# letters in Pokédex number used to detect alternative forms
+altform_regex = re.compile(r"[A-z]")
+masters_altform_regex = re.compile(r"[A-Z]")
 
-# build appropriate template
-def build_template(img, prefix, type, game, gameabbr, ani, credits):
-    # initialize variables to avoid errors
-    back = None
-    shiny = None
-    female = None
-    altform = None
-    event = None
-    # detect type, game and other info
+
+# build a single regex matching all file names supported with given arguments, with
+# a named group for each kind of file and for each of its data
+def build_classifier(prefix, type, gameabbr):
     if prefix in ["Spr", "Icon"]:
         # type and game must be specified in these cases
-        ndex, back, shiny, female, altform = get_data_main(img, prefix, gameabbr)
+        patterns = [main_pattern.format(prefix=prefix, gameabbr=re.escape(gameabbr))]
     elif type == "mini sprite":
         # game must be specified in these cases
-        type, ndex, ani, shiny, altform = get_data_ms(img)
-    elif re.search(r"^(Home|Mini)[mf]", img):
-        game = "Pokémon HOME"
-        type, ndex, ani, back, shiny, female, altform = get_data_home(img)
-    elif img.startswith("GO"):
-        game = "Pokémon GO"
-        type, ndex, shiny, female, altform, event = get_data_go(img)
-    elif img.startswith("Sleep"):
-        game = "Pokémon Sleep"
-        type, ndex, shiny, altform, event = get_data_sleep(img)
-    elif img.startswith("Masters"):
-        game = "Pokémon Masters EX"
-        type, ndex, shiny, female, altform = get_data_masters(img)
+        patterns = [ms_pattern]
+    else:
+        patterns = [home_pattern, go_pattern, sleep_pattern, masters_pattern]
+    return re.compile("|".join(patterns))
+
+
+# convert a matched group to "yes" or "no"
+def yes_no(group):
+    return "yes" if group is not None else "no"
+
+
+# get template parameters of given file with a single match of given classifier,
+# or None if file name is not supported
+def classify(img, classifier, prefix, gameabbr):
+    match = classifier.fullmatch(img)
+    if not match:
+        return None
+    # group of kind of file is the outermost one, so it's the last to be closed
+    kind = match.lastgroup
+    if kind == "main":
+        ndex = match["main_ndex"]
+        if prefix == "Spr" and not gameabbr.startswith("dex"):
+            back = yes_no(match["main_back"])
+        else:
+            back = ""
+        return {
+            "ndex": ndex,
+            "back": back,
+            "shiny": yes_no(match["main_shiny"]),
+            "female": yes_no(match["main_female"]),
+            "altform": yes_no(altform_regex.search(ndex)),
+        }
+    if kind == "ms":
+        ndex = match["ms_ndex"]
+        if altform_regex.match(ndex):
+            ndex = "0000"
+        return {
+            "type": "mini sprite",
+            "ndex": ndex,
+            "ani": yes_no(match["ms_ani"]),
+            "shiny": yes_no(match["ms_shiny"]) if match["ms_ow"] else "",
+            "altform": yes_no(altform_regex.search(ndex)),
+        }
+    if kind == "home":
+        ndex = match["home_ndex"]
+        # resized models are only static and frontal
+        mini = match["home_mini"] is not None
+        return {
+            "game": "Pokémon HOME",
+            "type": "modelli scalati" if mini else "modelli",
+            "ndex": ndex,
+            "ani": "" if mini else "no",
+            "back": "" if mini else yes_no(match["home_back"]),
+            "shiny": yes_no(match["home_shiny"]),
+            "female": yes_no(match["home_female"]),
+            "altform": yes_no(altform_regex.search(ndex)),
+        }
+    if kind == "go":
+        ndex = match["go_ndex"]
+        return {
+            "game": "Pokémon GO",
+            "type": "modelli",
+            "ndex": ndex,
+            "shiny": yes_no(match["go_shiny"]),
+            "female": yes_no(match["go_female"] or match["go_female_last"]),
+            "altform": yes_no(altform_regex.search(ndex)),
+            "event": yes_no(match["go_event"]),
+        }
+    if kind == "sleep":
+        ndex = match["sleep_ndex"]
+        return {
+            "game": "Pokémon Sleep",
+            "type": "sprite stili di sonno" if match["sleep_sonno"] else "mugshot",
+            "ndex": ndex,
+            "shiny": yes_no(match["sleep_shiny"]),
+            "altform": yes_no(altform_regex.search(ndex)),
+            "event": yes_no(match["sleep_event"]),
+        }
+    ndex = match["masters_ndex"]
+    return {
+        "game": "Pokémon Masters EX",
+        "type": "modelli" if match["masters_ex"] else "mugshot",
+        "ndex": ndex,
+        "shiny": yes_no(match["masters_shiny"]),
+        "female": yes_no(match["masters_ndex_female"] or match["masters_female"]),
+        "altform": yes_no(masters_altform_regex.search(ndex)),
+    }
+
+
+# build appropriate template, or None if file name is not supported
+def build_template(img, classifier, prefix, type, game, gameabbr, ani, credits):
+    # detect type, game and other info
+    data = classify(img, classifier, prefix, gameabbr)
+    if data is None:
+        return None
+    data = {"type": type, "game": game, "ani": ani, **data}
     # build template with retrieved info
-    template = f"{{{{sprello|type={type}|ndex={ndex}|game={game}"
-    if ani:
-        template += f"|ani={ani}"
-    if back:
-        template += f"|back={back}"
-    if shiny:
-        template += f"|shiny={shiny}"
-    if female:
-        template += f"|female={female}"
-    if altform:
-        template += f"|altform={altform}"
-    if event:
-        template += f"|event={event}"
+    template = (
+        f"{{{{sprello|type={data['type']}|ndex={data['ndex']}|game={data['game']}"
+    )
+    for param in ["ani", "back", "shiny", "female", "altform", "event"]:
+        if data.get(param):
+            template += f"|{param}={data[param]}"
     if credits:
         template += f"|credits={credits}"
     template += "}}"
@@ -298,6 +267,9 @@ if __name__ == "__main__":
     parser.add_argument("--ani", default="")
     parser.add_argument("--credits", default="")
     parser.add_argument("--test", default="yes")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunksize", type=int, default=5 * 1024 * 1024)
+    parser.add_argument("--plan", default="no")
     args = parser.parse_args()
     # check arguments
     if args.dir and not os.path.isdir(args.dir):
@@ -310,11 +282,14 @@ if __name__ == "__main__":
         if not args.gameabbr:
             sys.exit(f'Error: argument "gameabbr" not provided!')
     test_mode = not (args.test.lower().strip() == "no")
+    classifier = build_classifier(args.prefix, args.type, args.gameabbr)
     # if a directory is specified, upload all images inside it
     if args.dir:
+        files = []
         for img in sorted(os.listdir(args.dir)):
             template = build_template(
                 img,
+                classifier,
                 args.prefix,
                 args.type,
                 args.game,
@@ -322,30 +297,36 @@ if __name__ == "__main__":
                 args.ani,
                 args.credits,
             )
-            if not test_mode:
-                page = pywikibot.Page(site, f"File:{img}")
-                if page.exists():
-                    if page.text.startswith("#RINVIA") or page.text.startswith("#REDIRECT"):  # fmt: skip
+            if template is None:
+                print(f"Skipping {img} since its name is not supported")
+                continue
+            if test_mode:
+                print(f"{img}   >   {template}")
+            files.append((os.path.join(args.dir, img), img, template))
+        # print upload plan, or upload images that are not identical to those in wiki
+        if args.plan.lower().strip() == "yes":
+            utils.print_upload_plan(utils.plan_uploads(site, files, args.workers))
+        elif not test_mode:
+            plan = utils.plan_uploads(site, files, args.workers)
+            print(f"Skipping {len(plan['identical'])} images identical to those in wiki")  # fmt: skip
+            identical = {name for _, name, _ in plan["identical"]}
+            files = [file for file in files if file[1] not in identical]
+            # check existing pages with batched queries
+            pages_info = utils.get_pages_info(site, [f"File:{img}" for _, img, _ in files])  # fmt: skip
+            uploads = []
+            for path, img, template in files:
+                page_info = pages_info[f"File:{img}"]
+                if page_info["exists"]:
+                    if page_info["redirect"]:
+                        page = pywikibot.Page(site, f"File:{img}")
                         page.delete("Bot: deleting redirect to upload actual image")
                     else:
                         print(f"Skipping {img} since it already exists and is not a redirect")  # fmt: skip
                         continue
-                # os.system(f'python3 pwb.py upload -keep -noverify -ignorewarn -abortonwarn:exists "{os.path.join(args.dir, img)}" "{template}"')  # fmt: skip
-                subprocess.run(
-                    [
-                        "python3",
-                        "pwb.py",
-                        "upload",
-                        "-keep",
-                        "-noverify",
-                        "-ignorewarn",
-                        "-abortonwarn:exists",
-                        f"{os.path.join(args.dir, img)}",
-                        f"{template}",
-                    ]
-                )
-            else:
-                print(f"{img}   >   {template}")
+                uploads.append((path, img, template))
+            # upload all images with a single session
+            if uploads:
+                utils.upload_files(site, uploads, args.workers, args.chunksize)
     # if a category is specified, update all its images
     elif args.cat:
         cat = pywikibot.Category(site, f"Categoria:{args.cat}")
@@ -353,6 +334,7 @@ if __name__ == "__main__":
             img = page.title().replace("File:", "")
             template = build_template(
                 img,
+                classifier,
                 args.prefix,
                 args.type,
                 args.game,
@@ -360,7 +342,9 @@ if __name__ == "__main__":
                 args.ani,
                 args.credits,
             )
-            if not test_mode:
+            if template is None:
+                print(f"Skipping {img} since its name is not supported")
+            elif not test_mode:
                 page.text = template
                 page.save("Bot: using new template for licenses and categories of Pokémon images")  # fmt: skip
             else:
@@ -35,3 +35,6 @@ export LUASCRPITSDIR="lua-scripts"
 
 # Output dir
 export OUTPUTMODULEDIR="learnlist-gen"
+
+# SQLite db, used instead of the docker container with create-pokemoves-data.sh -q
+export SQLITEDB="$TEMPOUTDIR/pokemoves.sqlite"
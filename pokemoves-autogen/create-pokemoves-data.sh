@@ -8,8 +8,9 @@ CFLAG=false
 CONTAINER="tmp-pokemoves-db-659"  # random default name
 DFLAG=false
 PFLAG=false
+QFLAG=false
 
-while getopts "hcd:Dp" o; do
+while getopts "hcd:Dpq" o; do
     case "${o}" in
         h)
             echo "Create data module PokéMoves-data from raw data.
@@ -29,7 +30,11 @@ Options:
             is ignored.
   -D        same as -d using the default specified in config file
   -p        only processes lua file, without recomputing them from csv.
-            Ignored with -c"
+            Ignored with -c
+  -q        recompute csv files from a local SQLite db instead of a docker
+            container. The db is \$SQLITEDB from config file, and only its
+            tables whose source csv changed are rebuilt. -d and -D are
+            ignored"
             exit 0
             ;;
         c)
@@ -46,6 +51,9 @@ Options:
 	    p)
 	        PFLAG=true
 	        ;;
+        q)
+            QFLAG=true
+            ;;
     esac
 done
 shift $((OPTIND-1))
@@ -54,7 +62,17 @@ shift $((OPTIND-1))
 # make-pokes.sh -l
 ./make-pokes.sh -s -
 
-if [[ $CFLAG == true ]] || [[ ! -d "$TEMPOUTDIR/pokecsv" ]]; then
+if [[ $QFLAG == true ]] && ( [[ $CFLAG == true ]] || [[ ! -d "$TEMPOUTDIR/pokecsv" ]] ); then
+    echo "========================= Recomputing csv files =========================="
+
+    # Load the SQLite db, rebuilding only tables whose source csv changed
+    python3 sqlite-db.py load "$SQLITEDB"
+
+    # Compute level, tm and tutor
+    mkdir -p "$TEMPOUTDIR/pokecsv"
+    mkdir -p "$TEMPOUTDIR/luamoves"
+    ./make-pokes.sh -cl -q "$SQLITEDB"
+elif [[ $CFLAG == true ]] || [[ ! -d "$TEMPOUTDIR/pokecsv" ]]; then
     echo "========================= Recomputing csv files =========================="
 
     # Setup the container to recompute csvs
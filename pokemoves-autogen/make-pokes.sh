@@ -4,6 +4,7 @@ source config.sh
 
 CFLAG=false
 LFLAG=false
+QFLAG=false
 SDIR="luamoves"
 DOCKERV="pokemovesdb"
 PORT=12345
@@ -11,7 +12,7 @@ PORT=12345
 repsrc=("farfetchd" "farfetchdG" "sirfetchd")
 repdst=("farfetch'd" "farfetch'dG" "sirfetch'd")
 
-while getopts "hcls:d:p:b:" o; do
+while getopts "hcls:d:p:q:b:" o; do
     case "${o}" in
         h)
             echo "Options:
@@ -22,6 +23,8 @@ while getopts "hcls:d:p:b:" o; do
              if DIR is equal to - it uses no source, only adds head and foot
     -d name  docker, name of the docker image with the right version of psql.
     -p num   port, port of the docker image running the db.
+    -q DB    sqlite, recompute csv files from SQLite db DB (built by
+             sqlite-db.py load) instead of docker. Ignores -d and -p.
     -b POKE  begin, only recomputes csvs, and only from pokemon POKE onward.
              If this option is given, ignores -l"
             exit 0
@@ -41,6 +44,10 @@ while getopts "hcls:d:p:b:" o; do
         p)
             PORT=$OPTARG
             ;;
+        q)
+            QFLAG=true
+            QDB="$OPTARG"
+            ;;
         b)
             BEGIN=$OPTARG
             ;;
@@ -82,6 +89,10 @@ if ! [[ -z ${BEGIN+x} ]]; then
         echo "-b given, but not -c. Please explicitly ask to recompute csv files. Aborting"
         exit 1
     fi
+    if [[ $QFLAG == true ]]; then
+        python3 sqlite-db.py export "$QDB" "${TEMPOUTDIR}/pokecsv" --pokelist "$POKELIST" --begin "$BEGIN"
+        exit 0
+    fi
     sed -e/"${BEGIN}"/\{ -e:1 -en\;b1 -e\} -ed $POKELIST | while read poke; do
         create_csv "$poke"
         echo "$poke"
@@ -94,8 +105,12 @@ fi
 echo "local m = {}" > "$outfile"
 echo "" >> "$outfile"
 if ! [[ $SDIR == "-" ]]; then
+    # With SQLite all csv files are exported at once, by a single process
+    if [[ $CFLAG == true ]] && [[ $QFLAG == true ]]; then
+        python3 sqlite-db.py export "$QDB" "${TEMPOUTDIR}/pokecsv" --pokelist "$POKELIST" > /dev/null
+    fi
     while read poke; do
-        if [[ $CFLAG == true ]]; then
+        if [[ $CFLAG == true ]] && [[ $QFLAG == false ]]; then
             create_csv "${poke}"
         fi
         pokemodule=$poke
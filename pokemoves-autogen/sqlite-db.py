@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+"""Build the moves db in a local SQLite file, as an alternative to Docker.
+
+The schema is read from docker-db/create-tables.sql and the csv files to load
+from the \\COPY commands in docker-db/load-pokes.sh, so the db has the same
+tables and data as the PostgreSQL container. Commands:
+
+load DB: create or update DB. Each table is rebuilt, with bulk inserts in a
+single transaction, only when its schema or any of its source csv changed
+since the last load.
+
+export DB OUTDIR [--pokelist FILE] [--begin POKE]: write the csv of every
+Pokémon in FILE (default: lists/pokemon-names.list) to OUTDIR, as the query of
+make-pokes.sh -c does. With --begin, start from Pokémon POKE.
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DOCKER_DB_DIR = os.path.join(script_dir, "docker-db")
+CREATE_TABLES = os.path.join(DOCKER_DB_DIR, "create-tables.sql")
+LOAD_POKES = os.path.join(DOCKER_DB_DIR, "load-pokes.sh")
+SOURCE_CSV_DIR = os.path.join(DOCKER_DB_DIR, "sourcecsv")
+
+CREATE_TABLE_REGEX = re.compile(r"CREATE TABLE public\.(\w+) \((.*?)\n\);", re.S)
+CONSTRAINT_REGEX = re.compile(
+    r"ALTER TABLE ONLY public\.(\w+)\s+ADD CONSTRAINT \w+ (.*?);", re.S
+)
+COPY_REGEX = re.compile(
+    r"\\\\COPY (\w+)\s+FROM '/data/sourcecsv/([^']+)'\s+WITH csv( header)?"
+)
+
+# indexes needed by the export query, besides primary keys
+INDEXES = {
+    "pokemon": ["CREATE INDEX pokemon_identifier ON pokemon (identifier)"],
+    "pokemon_moves": [
+        "CREATE INDEX pokemon_moves_pokemon_id ON pokemon_moves (pokemon_id)"
+    ],
+}
+
+EXPORT_QUERY = """
+SELECT m.identifier, pmm.identifier, vg.generation_id, vg.identifier, pm.level
+FROM pokemon_moves AS pm
+JOIN pokemon AS p ON pm.pokemon_id = p.id
+JOIN pokemon_move_methods AS pmm ON pm.pokemon_move_method_id = pmm.id
+JOIN version_groups AS vg ON pm.version_group_id = vg.id
+JOIN moves AS m ON pm.move_id = m.id
+WHERE p.identifier = ?
+ORDER BY pmm.id, vg.generation_id, vg.id, pm.level, pm.rowid
+"""
+
+
+# get CREATE TABLE statement of each table, with its constraints
+def read_schema(filename: str) -> Dict[str, str]:
+    with open(filename, "r") as f:
+        sql = f.read()
+    columns = {
+        table: [body.strip("\n")] for table, body in CREATE_TABLE_REGEX.findall(sql)
+    }
+    for table, constraint in CONSTRAINT_REGEX.findall(sql):
+        columns[table].append("    " + constraint.replace("public.", ""))
+    return {
+        table: f"CREATE TABLE {table} (\n" + ",\n".join(body) + "\n)"
+        for table, body in columns.items()
+    }
+
+
+# get (csv file, whether it has a header) of each table, in loading order
+def read_sources(filename: str) -> Dict[str, List[Tuple[str, bool]]]:
+    with open(filename, "r") as f:
+        script = f.read()
+    sources = {}
+    for table, csvfile, header in COPY_REGEX.findall(script):
+        sources.setdefault(table, []).append((csvfile, bool(header)))
+    return sources
+
+
+# hash of everything a table is built from, to know whether to rebuild it
+def table_signature(create: str, sources: List[Tuple[str, bool]]) -> str:
+    sha = hashlib.sha256(create.encode())
+    for csvfile, header in sources:
+        sha.update(f"\n{csvfile},{header}\n".encode())
+        path = os.path.join(SOURCE_CSV_DIR, csvfile)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+
+# read rows of a csv file, skipping the header as COPY does and with empty
+# values as NULL
+def read_rows(csvfile: str, header: bool) -> Iterable[List]:
+    with open(os.path.join(SOURCE_CSV_DIR, csvfile), "r", newline="") as f:
+        reader = csv.reader(f)
+        if header:
+            next(reader, None)
+        for row in reader:
+            yield [value if value != "" else None for value in row]
+
+
+# drop and create table, then insert rows of its sources; return number of rows
+def load_table(conn, table: str, create: str, sources: List[Tuple[str, bool]]):
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(create)
+    columns = len(conn.execute(f"SELECT * FROM {table}").description)
+    placeholders = ", ".join("?" * columns)
+    count = 0
+    for csvfile, header in sources:
+        if not os.path.exists(os.path.join(SOURCE_CSV_DIR, csvfile)):
+            print(f"{table}: missing source {csvfile}", file=sys.stderr)
+            continue
+        rows = read_rows(csvfile, header)
+        cursor = conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)  # fmt: skip
+        count += cursor.rowcount
+    # indexes are created after inserts, which is faster than updating them
+    for index in INDEXES.get(table, []):
+        conn.execute(index)
+    return count
+
+
+def load(db: str):
+    schema = read_schema(CREATE_TABLES)
+    sources = read_sources(LOAD_POKES)
+    # transactions are handled explicitly, so that DDL statements are part of them
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS signatures (table_name TEXT PRIMARY KEY, signature TEXT)"  # fmt: skip
+    )
+    signatures = dict(conn.execute("SELECT table_name, signature FROM signatures"))
+    # a single transaction for all tables, so a failed load leaves the db as it was
+    conn.execute("BEGIN")
+    try:
+        for table, create in schema.items():
+            table_sources = sources.get(table, [])
+            signature = table_signature(create, table_sources)
+            if signatures.get(table) == signature:
+                print(f"{table}: unchanged")
+                continue
+            count = load_table(conn, table, create, table_sources)
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures VALUES (?, ?)", (table, signature)
+            )
+            print(f"{table}: loaded {count} rows")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def export(db: str, outdir: str, pokelist: str, begin: str = None):
+    with open(pokelist, "r") as f:
+        pokes = [line.strip() for line in f if line.strip()]
+    if begin is not None:
+        pokes = pokes[pokes.index(begin) :]
+    conn = sqlite3.connect(db)
+    for poke in pokes:
+        with open(os.path.join(outdir, f"{poke}.csv"), "w", newline="") as out:
+            csv.writer(out, lineterminator="\n").writerows(
+                conn.execute(EXPORT_QUERY, (poke,))
+            )
+        print(poke)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    load_parser = subparsers.add_parser("load")
+    load_parser.add_argument("db")
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("db")
+    export_parser.add_argument("outdir")
+    export_parser.add_argument("--pokelist", default="lists/pokemon-names.list")
+    export_parser.add_argument("--begin")
+    args = parser.parse_args()
+    if args.command == "load":
+        load(args.db)
+    else:
+        export(args.db, args.outdir, args.pokelist, args.begin)
+
+
+if __name__ == "__main__":
+    main()
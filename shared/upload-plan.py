@@ -0,0 +1,41 @@
+import pywikibot, argparse, os, os.path, sys, importlib
+
+"""
+This script compares all files in a directory with files of the same name in wiki
+by SHA-1, to find which ones are new, changed or identical (and then don't need to
+be uploaded). Arguments:
+--dir: directory with files to check.
+--list: comma-separated kinds of files to list, only their paths are printed one
+per line (for example "new,changed" to get files to upload); if not specified, all
+files are printed with their kind, followed by number of files of each kind.
+--workers: number of local files read at the same time (default 4).
+"""
+
+# import utils from this directory
+script_path = os.path.realpath(__file__)
+script_dir = os.path.dirname(script_path)
+spec = importlib.util.spec_from_file_location("utils", os.path.join(script_dir, "utils.py"))  # fmt: skip
+utils = importlib.util.module_from_spec(spec)
+sys.modules["utils"] = utils
+spec.loader.exec_module(utils)
+
+
+# main function
+if __name__ == "__main__":
+    site = pywikibot.Site()
+    # parse arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", default="")
+    parser.add_argument("--list", default="")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    if not os.path.isdir(args.dir):
+        sys.exit(f'Error: directory "{args.dir}" not found!')
+    files = [(os.path.join(args.dir, name), name, "") for name in sorted(os.listdir(args.dir))]  # fmt: skip
+    plan = utils.plan_uploads(site, files, args.workers)
+    if args.list:
+        for kind in args.list.split(","):
+            for path, _, _ in plan[kind]:
+                print(path)
+    else:
+        utils.print_upload_plan(plan)
@@ -1,7 +1,11 @@
 import os
 import json
 import re
+import time
+import hashlib
 import pywikibot
+from concurrent.futures import ThreadPoolExecutor
+from pywikibot.data import api
 
 
 # utility function to remove invalid characters from file names, by replacing
@@ -115,6 +119,148 @@ def title_en_to_it(title_en, en_to_it):
     return title_it
 
 
+# Upload files to wiki in this process, using the same session for all of them.
+# uploads is a list of (path, file name without namespace, description) tuples;
+# up to workers files are uploaded at the same time (pywikibot throttle still
+# applies), files larger than chunk_size bytes are uploaded in chunks. As done by
+# pywikibot upload script with -ignorewarn -abortonwarn:exists, all warnings are
+# ignored except for existing files, which are not overwritten. Time taken by
+# each file is printed; return names of files that were not uploaded.
+def upload_files(site, uploads, workers=4, chunk_size=5 * 1024 * 1024):
+    # called by pywikibot with upload warnings, upload goes on if it returns True
+    def ignore_warnings(warnings):
+        return all(warning.code != "exists" for warning in warnings)
+
+    def upload(path, name, description):
+        start = time.time()
+        file_page = pywikibot.FilePage(site, f"File:{name}")
+        file_page.text = description
+        try:
+            uploaded = file_page.upload(
+                path,
+                ignore_warnings=ignore_warnings,
+                chunk_size=chunk_size,
+                report_success=False,
+            )
+        except Exception as e:
+            print(f"Error uploading {name}: {e}")
+            uploaded = False
+        if uploaded:
+            print(f"Uploaded {name} in {time.time() - start:.1f} s")
+        else:
+            print(f"Not uploaded: {name}")
+        return uploaded
+
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(lambda upload_args: upload(*upload_args), uploads))
+    return [name for (_, name, _), uploaded in zip(uploads, results) if not uploaded]
+
+
+# get max number of titles per API query: 500 with apihighlimits right (bots), 50 otherwise
+def get_titles_batch_size(site):
+    return 500 if site.has_right("apihighlimits") else 50
+
+
+# Get existence, redirect target and current text of given pages with a query for
+# each batch of titles (see get_titles_batch_size), as {title: {"exists": ...,
+# "redirect": ..., "text": ...}} where title is as given; redirect is title of
+# target page if page is a redirect, otherwise an empty string; missing pages
+# have empty text
+def get_pages_info(site, titles):
+    batch_size = get_titles_batch_size(site)
+    redirect_regex = re.compile(r"#\s*(?:RINVIA|REDIRECT)\s*\[\[:?([^\]\|#]+)", re.IGNORECASE)  # fmt: skip
+    info = {}
+    for i in range(0, len(titles), batch_size):
+        # normalize titles like API does, to find them in API results
+        batch = {}
+        for title in titles[i : i + batch_size]:
+            batch.setdefault(pywikibot.Page(site, title).title(), []).append(title)
+        pages = api.PropertyGenerator(
+            "info|revisions",
+            site=site,
+            parameters={
+                "titles": "|".join(batch),
+                "rvprop": "content",
+                "rvslots": "main",
+            },
+        )
+        for page in pages:
+            if "missing" in page or "invalid" in page:
+                entry = {"exists": False, "redirect": "", "text": ""}
+            # pages without revisions may be split by query continuation
+            elif page.get("revisions"):
+                main_slot = page["revisions"][0]["slots"]["main"]
+                text = main_slot.get("content", main_slot.get("*", ""))
+                redirect = redirect_regex.match(text) if "redirect" in page else None
+                target = redirect.group(1).strip() if redirect else ""
+                entry = {"exists": True, "redirect": target, "text": text}
+            else:
+                continue
+            for title in batch.get(page["title"], []):
+                info[title] = entry
+    return info
+
+
+# get SHA-1 of given local files as {path: SHA-1}, reading them in parallel
+def get_files_sha1(paths, workers=4):
+    def get_sha1(path):
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    with ThreadPoolExecutor(workers) as executor:
+        return dict(zip(paths, executor.map(get_sha1, paths)))
+
+
+# get SHA-1 of current version of given files in wiki as {file name: SHA-1}, with
+# a query for each batch of files (see get_titles_batch_size); file names are
+# without namespace, missing files are not included
+def get_wiki_files_sha1(site, names):
+    batch_size = get_titles_batch_size(site)
+    sha1s = {}
+    for i in range(0, len(names), batch_size):
+        # normalize titles like API does, to find them in API results
+        titles = {pywikibot.FilePage(site, f"File:{name}").title(): name for name in names[i : i + batch_size]}  # fmt: skip
+        pages = api.PropertyGenerator(
+            "imageinfo",
+            site=site,
+            parameters={"titles": "|".join(titles), "iiprop": "sha1"},
+        )
+        for page in pages:
+            if page.get("imageinfo") and page["title"] in titles:
+                sha1s[titles[page["title"]]] = page["imageinfo"][0]["sha1"]
+    return sha1s
+
+
+# Compare local files to upload (as in upload_files) with files in wiki by SHA-1,
+# returning them split in {"new": [...], "changed": [...], "identical": [...]}:
+# files missing from wiki, files in wiki with different content and files already
+# in wiki with the same content, which don't need to be uploaded again
+def plan_uploads(site, uploads, workers=4):
+    local_sha1s = get_files_sha1([path for path, _, _ in uploads], workers)
+    wiki_sha1s = get_wiki_files_sha1(site, [name for _, name, _ in uploads])
+    plan = {"new": [], "changed": [], "identical": []}
+    for upload in uploads:
+        path, name, _ = upload
+        if name not in wiki_sha1s:
+            plan["new"].append(upload)
+        elif wiki_sha1s[name] == local_sha1s[path]:
+            plan["identical"].append(upload)
+        else:
+            plan["changed"].append(upload)
+    return plan
+
+
+# print files of upload plan and their number, without uploading anything
+def print_upload_plan(plan):
+    for kind, uploads in plan.items():
+        for _, name, _ in uploads:
+            print(f"{kind}: {name}")
+    print(", ".join(f"{len(uploads)} {kind}" for kind, uploads in plan.items()))
+
+
 # print warning if file is launched standalone
 if __name__ == "__main__":
     print("This file contains various utilities and is not meant to be executed standalone")  # fmt: skip